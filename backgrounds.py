@@ -0,0 +1,193 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+import config
+from procedural import variant_names, variant_path
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+
+def image_nbytes(img: Image.Image) -> int:
+    """Approximate decoded size of an image in memory"""
+    return img.width * img.height * len(img.getbands())
+
+
+class BackgroundCache:
+    """LRU cache of decoded, resized backgrounds keyed by (path, mtime, size)
+
+    Cached images are shared, so callers must .copy() before drawing on them.
+    """
+
+    def __init__(self, max_bytes: int = None):
+        self.max_bytes = config.BACKGROUND_CACHE['max_bytes'] if max_bytes is None else max_bytes
+        self._images: 'OrderedDict[tuple, Image.Image]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def current_bytes(self) -> int:
+        return self._bytes
+
+    def load(self, path: str, size: Tuple[int, int]) -> Image.Image:
+        """Decode and resize the file at path once per mtime"""
+        mtime = os.stat(path).st_mtime_ns
+        key = (os.path.abspath(path), mtime, tuple(size))
+
+        def decode():
+            with Image.open(path) as img:
+                return img.convert('RGB').resize(size, Image.Resampling.LANCZOS)
+
+        return self.get(key, decode, stale_prefix=key[0])
+
+    def generated(self, name: str, size: Tuple[int, int], factory: Callable[[int, int], Image.Image]) -> Image.Image:
+        """Build a procedural background once per (name, size)"""
+        key = (f"<{name}>", 0, tuple(size))
+        return self.get(key, lambda: factory(*size).convert('RGB'))
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+            self._bytes = 0
+
+    def get(self, key: tuple, build: Callable[[], Image.Image], stale_prefix: str = None) -> Image.Image:
+        """Return the image for key, building it on a miss
+
+        Keys start with (source, version); with stale_prefix set, entries for the
+        same source at another version are dropped when the new one is stored.
+        """
+        with self._lock:
+            img = self._images.get(key)
+            if img is not None:
+                self._images.move_to_end(key)
+                return img
+
+        img = build()
+
+        with self._lock:
+            if stale_prefix is not None:
+                # The file changed on disk: drop every older decode of it
+                for old_key in [k for k in self._images if k[0] == stale_prefix and k[1] != key[1]]:
+                    self._bytes -= image_nbytes(self._images.pop(old_key))
+            if key not in self._images:
+                self._images[key] = img
+                self._bytes += image_nbytes(img)
+            self._evict()
+            return self._images.get(key, img)
+
+    def resize(self, max_bytes: int):
+        """Change the byte cap, evicting least recently used images to fit"""
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def _evict(self):
+        # Caller holds the lock; the newest image always stays so callers get it back
+        while self._bytes > self.max_bytes and len(self._images) > 1:
+            _, evicted = self._images.popitem(last=False)
+            self._bytes -= image_nbytes(evicted)
+
+
+background_cache = BackgroundCache()
+
+
+class BackgroundIndex:
+    """Validated backgrounds by stable name, built once and rescanned off the request path"""
+
+    def __init__(self, folder: str = None, cache: BackgroundCache = None):
+        self.folder = folder or config.BACKGROUNDS_FOLDER
+        self.cache = cache or background_cache
+        self.size = (config.DEFAULT_CARD_WIDTH, config.DEFAULT_CARD_HEIGHT)
+        self._paths: Dict[str, str] = {}
+        self._variants = variant_names()
+        self._signature = None
+        self.rejected: Dict[str, str] = {}
+
+    def get(self, name: str = None) -> Optional[str]:
+        """Path of the named background, or the default one when name is None
+
+        Image files take precedence; procedural-N names select generated variants.
+        """
+        if name is None:
+            name = config.BACKGROUND_INDEX['default']
+            if name not in self._paths:
+                return next(iter(self._paths.values()), None)
+        name = name.lower()
+        if name in self._paths:
+            return self._paths[name]
+        return variant_path(name) if name in self._variants else None
+
+    def names(self) -> List[str]:
+        return list(self._paths) + [name for name in self._variants if name not in self._paths]
+
+    def __len__(self):
+        return len(self._paths)
+
+    def _scan_signature(self) -> tuple:
+        if not os.path.isdir(self.folder):
+            return ()
+        files = []
+        for entry in os.scandir(self.folder):
+            if entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS) and not entry.name.startswith('.'):
+                stat = entry.stat()
+                files.append((entry.name, stat.st_mtime_ns, stat.st_size))
+        return tuple(sorted(files))
+
+    def refresh(self) -> bool:
+        """Rebuild the index if any background file was added, removed or changed"""
+        signature = self._scan_signature()
+        if signature == self._signature:
+            return False
+        self._build(signature)
+        return True
+
+    def _build(self, signature: tuple):
+        paths: Dict[str, str] = {}
+        rejected: Dict[str, str] = {}
+        for name, _, _ in signature:
+            path = f"{self.folder}/{name}"
+            error = self.validate(path)
+            if error:
+                rejected[name] = error
+                continue
+            key = os.path.splitext(name)[0].lower()
+            if key in paths:
+                rejected[name] = f"duplicate name '{key}'"
+                continue
+            # Decode and resize now so the first card using it pays nothing
+            try:
+                self.cache.load(path, self.size)
+            except Exception as e:
+                rejected[name] = f"could not decode ({e})"
+                continue
+            paths[key] = path
+
+        for name, error in rejected.items():
+            if self.rejected.get(name) != error:
+                print(f"⚠️ Skipping background {name}: {error}")
+        # Swap in one assignment so readers never see a half-built index
+        self._paths = paths
+        self.rejected = rejected
+        self._signature = signature
+
+    def validate(self, path: str) -> Optional[str]:
+        """Return why the image at path cannot be used, or None if it is fine"""
+        settings = config.BACKGROUND_INDEX
+        try:
+            with Image.open(path) as img:
+                width, height = img.size
+                img.verify()
+        except Exception as e:
+            return f"unreadable image ({e})"
+        if width < settings['min_width'] or height < settings['min_height']:
+            return f"too small ({width}x{height}, need at least {settings['min_width']}x{settings['min_height']})"
+        target = self.size[0] / self.size[1]
+        if abs(width / height - target) / target > settings['aspect_tolerance']:
+            return f"wrong aspect ratio ({width}x{height}, cards are {self.size[0]}x{self.size[1]})"
+        return None
+
+
+background_index = BackgroundIndex()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Headless batch rendering of PNL cards
+Reads trades from CSV or JSONL (or stdin) and renders them across all cores
+
+Example:
+    python batch_render.py trades.csv --output recaps.zip --price 150
+"""
+
+import argparse
+import asyncio
+import itertools
+import os
+import re
+import sys
+import tarfile
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+# Add the current directory to Python path so we can import our modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import config
+from backgrounds import background_index
+from card import ENCODERS, BufferReader, encoder_options, render_card
+from fonts import preload_fonts
+from price_service import PriceService, PriceUnavailable
+from render_executor import SharedCard, attach_card, share_card, shared_memory_folder
+from trade_input import detect_format, normalize_trade, read_trades
+
+
+def safe_name(text: str) -> str:
+    return re.sub(r'[^A-Za-z0-9_-]+', '_', str(text)).strip('_')[:40] or 'card'
+
+
+class CardSink:
+    """Writes rendered cards to a directory, .zip or .tar and remembers what is already there"""
+
+    def __init__(self, output: str):
+        self.output = output
+        lower = output.lower()
+        self.kind = 'zip' if lower.endswith('.zip') else 'tar' if lower.endswith('.tar') else 'dir'
+        self.archive = None
+
+        if self.kind == 'dir':
+            os.makedirs(output, exist_ok=True)
+            self.existing = set(os.listdir(output))
+        elif self.kind == 'zip':
+            # Already-compressed images gain nothing from deflate
+            self.archive = zipfile.ZipFile(output, 'a', compression=zipfile.ZIP_STORED)
+            self.existing = set(self.archive.namelist())
+        else:
+            self.archive = tarfile.open(output, 'a')
+            self.existing = set(self.archive.getnames())
+
+    def write(self, name: str, data):
+        if self.kind == 'dir':
+            tmp_path = os.path.join(self.output, f".{name}.tmp")
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, os.path.join(self.output, name))
+        elif self.kind == 'zip':
+            self.archive.writestr(name, data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            self.archive.addfile(info, BufferReader(data))
+        self.existing.add(name)
+
+    def close(self):
+        if self.archive is not None:
+            self.archive.close()
+
+
+def render_trade(name: str, trade: dict, sol_price: float, background_path: str, encoder: str, shared_folder: str = ''):
+    """Worker entry point: render one trade and return (name, encoded card), via shared memory when available"""
+    encoded = render_card(trade['username'], trade['coin_name'], trade['bought'], trade['sold'],
+                          sol_price, background_path, encoder=encoder)
+    return name, share_card(encoded, shared_folder) if shared_folder else encoded
+
+
+def fetch_price() -> float:
+    """One live SOL quote for the whole run"""
+    async def fetch():
+        service = PriceService()
+        try:
+            return await service.get_price('solana')
+        finally:
+            await service.close()
+
+    try:
+        return asyncio.run(fetch())
+    except PriceUnavailable as e:
+        print(f"⚠️ {e}, using fallback price")
+        return config.FALLBACK_SOL_PRICE
+
+
+def run_batch(args) -> int:
+    source = sys.stdin if args.input == '-' else open(args.input, newline='')
+    first_line = source.readline()
+    input_format = args.format or detect_format(args.input, first_line)
+    lines = itertools.chain([first_line], source)
+
+    sol_price = args.price if args.price is not None else fetch_price()
+    extension = encoder_options(args.encoder or config.ENCODER['format'])[1]
+
+    # Decode the background before forking so every worker inherits it
+    background_index.refresh()
+    background_path = background_index.get(args.background)
+    if args.background and background_path is None:
+        print(f"❌ Unknown background '{args.background}'")
+        return 1
+
+    sink = CardSink(args.output)
+    shared_folder = shared_memory_folder()
+    workers = args.workers or os.cpu_count() or 1
+    max_in_flight = workers * 4
+    rendered = skipped = failed = 0
+    started = time.perf_counter()
+    print(f"🚀 Rendering with {workers} worker(s) at SOL ${sol_price:.2f} into {args.output}")
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=preload_fonts) as pool:
+            in_flight = set()
+
+            def drain(block_until_below: int):
+                nonlocal rendered, failed
+                while len(in_flight) >= block_until_below and in_flight:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        in_flight.discard(future)
+                        try:
+                            name, encoded = future.result()
+                            if isinstance(encoded, SharedCard):
+                                encoded = attach_card(encoded)
+                        except Exception as e:
+                            failed += 1
+                            print(f"   ❌ Render failed: {e}")
+                            continue
+                        # Written straight from the worker's shared memory
+                        sink.write(name, encoded.data)
+                        rendered += 1
+                        if rendered % args.progress_every == 0:
+                            elapsed = time.perf_counter() - started
+                            print(f"   {rendered} cards, {rendered / elapsed:.1f} cards/s")
+
+            for number, row in enumerate(read_trades(lines, input_format), 1):
+                try:
+                    trade = normalize_trade(row)
+                except (ValueError, TypeError) as e:
+                    failed += 1
+                    print(f"   ❌ Row {number}: {e}")
+                    continue
+
+                # Names depend only on the input row, so a rerun can skip finished cards
+                name = f"{number:06d}_{safe_name(trade['username'])}_{safe_name(trade['coin_name'])}.{extension}"
+                if args.resume and name in sink.existing:
+                    skipped += 1
+                    continue
+
+                in_flight.add(pool.submit(render_trade, name, trade, sol_price, background_path, args.encoder, shared_folder))
+                drain(max_in_flight)
+            drain(1)
+    except KeyboardInterrupt:
+        print("\n🛑 Interrupted, finished cards are kept; rerun with --resume to continue")
+    finally:
+        sink.close()
+        if source is not sys.stdin:
+            source.close()
+
+    elapsed = time.perf_counter() - started
+    rate = rendered / elapsed if elapsed > 0 else 0.0
+    print(f"✅ Rendered {rendered}, skipped {skipped}, failed {failed} in {elapsed:.1f}s ({rate:.1f} cards/s)")
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render PNL cards in bulk from CSV or JSONL trades")
+    parser.add_argument('input', help="Trades file (.csv or .jsonl), or - for stdin")
+    parser.add_argument('--output', '-o', required=True, help="Output directory, or a .zip/.tar archive")
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help="Input format (detected by default)")
+    parser.add_argument('--price', type=float, help="Fixed SOL price for reproducible offline runs")
+    parser.add_argument('--encoder', choices=ENCODERS, help="Output image format")
+    parser.add_argument('--background', help="Background name from the backgrounds folder")
+    parser.add_argument('--workers', type=int, default=0, help="Worker processes (0 = one per CPU core)")
+    parser.add_argument('--resume', action='store_true', help="Skip cards already present in the output")
+    parser.add_argument('--progress-every', type=int, default=100, help="Print throughput every N cards")
+    sys.exit(run_batch(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Trade ledger benchmark
+Ingests synthetic trades through the batched writer and compares aggregate reads against full scans
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Add the current directory to Python path so we can import our modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from benchmark_render import summarize
+from ledger import Trade, TradeLedger
+
+COINS = ['SOL', 'BONK', 'WIF', 'JUP', 'PYTH', 'RAY', 'JTO', 'POPCAT', 'BTC', 'ETH']
+
+
+def synthetic_trades(count: int, users: int, guilds: int, seed: int = 42):
+    rng = random.Random(seed)
+    for _ in range(count):
+        user_id = rng.randrange(users)
+        bought = round(rng.uniform(0.1, 100.0), 2)
+        yield Trade(rng.randrange(guilds), user_id, f"Trader{user_id}", rng.choice(COINS),
+                    bought, round(bought * rng.uniform(0.2, 3.0), 2), round(rng.uniform(90.0, 250.0), 2))
+
+
+async def ingest(ledger: TradeLedger, trades) -> float:
+    """Record every trade as /pnl would, yielding to the loop like real traffic, then flush"""
+    started = time.perf_counter()
+    for number, trade in enumerate(trades, 1):
+        ledger.record(trade)
+        if number % 1000 == 0:
+            await asyncio.sleep(0)
+    await ledger.flush()
+    return time.perf_counter() - started
+
+
+def time_reads(ledger: TradeLedger, users: int, guilds: int, reads: int):
+    """Per-read latency of the aggregate lookup vs the same numbers computed by scanning trades"""
+    rng = random.Random(7)
+    keys = [(rng.randrange(guilds), rng.randrange(users)) for _ in range(reads)]
+    aggregate, scan = [], []
+    mismatches = 0
+    for guild_id, user_id in keys:
+        started = time.perf_counter()
+        totals = ledger.user_totals(guild_id, user_id)
+        aggregate.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        row = ledger._db.execute(
+            'SELECT COUNT(*), SUM(sold - bought) FROM trades WHERE guild_id = ? AND user_id = ?', (guild_id, user_id)
+        ).fetchone()
+        scan.append(time.perf_counter() - started)
+
+        if totals is not None and (totals.trades != row[0] or abs(totals.pnl - row[1]) > 1e-6 * max(1.0, abs(row[1]))):
+            mismatches += 1
+    return summarize(aggregate), summarize(scan), mismatches
+
+
+async def run(args):
+    path = args.path or os.path.join(tempfile.mkdtemp(prefix='ledger-bench-'), 'ledger.sqlite3')
+    ledger = TradeLedger(path, batch_size=args.batch_size, flush_interval=0.05)
+    await ledger.start()
+    try:
+        elapsed = await ingest(ledger, synthetic_trades(args.trades, args.users, args.guilds))
+        print(f"📥 Ingested {ledger.written:,} trades in {elapsed:.2f}s ({ledger.written / elapsed:,.0f} trades/s), "
+              f"batch size {args.batch_size}")
+
+        aggregate, scan, mismatches = time_reads(ledger, args.users, args.guilds, args.reads)
+        print(f"{'read':<10} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for label, stats in (('aggregate', aggregate), ('scan', scan)):
+            print(f"{label:<10} {stats['mean_ms']:>9.3f} {stats['p50_ms']:>9.3f} {stats['p95_ms']:>9.3f} {stats['p99_ms']:>9.3f}")
+        print(f"{'✅' if mismatches == 0 else '❌'} Aggregates match scans for {args.reads - mismatches}/{args.reads} users")
+        print(f"💾 {path} ({os.path.getsize(path) / 1024 / 1024:.1f} MB)")
+        return 0 if mismatches == 0 else 1
+    finally:
+        await ledger.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark trade ledger ingest and aggregate reads")
+    parser.add_argument('--trades', type=int, default=100_000)
+    parser.add_argument('--users', type=int, default=5_000)
+    parser.add_argument('--guilds', type=int, default=10)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--reads', type=int, default=500, help="User summaries read after ingest")
+    parser.add_argument('--path', help="Database file (a temporary one by default)")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
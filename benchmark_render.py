@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Render benchmarks for PNL cards
+Runs offline with a fixed SOL price, no Discord or network needed
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+
+import PIL
+
+# Add the current directory to Python path so we can import our modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import config
+from backgrounds import background_cache, background_index
+from card import ENCODERS, PNLCard, encode_image, render_card, template_cache, warm_card_assets
+from fonts import FontRegistry, preload_fonts
+from memory_budget import MB, apply_budget, plan_for_cards, tree_peak_rss_bytes
+from procedural import generate_background, procedural_path
+from render_executor import RenderExecutor
+from result_cache import CardResultCache
+
+FIXED_PRICE = 150.0
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def find_background():
+    """Default indexed background, or None for the generated background"""
+    background_index.refresh()
+    return background_index.get()
+
+
+async def simulate_interactions(concurrency: int, executor: RenderExecutor = None):
+    """Fire N concurrent /pnl renders while a probe measures event-loop responsiveness"""
+    background = find_background()
+    probe_lags = []
+    stop = asyncio.Event()
+
+    async def probe():
+        # Stands in for every other interaction and the gateway heartbeat
+        interval = 0.01
+        while not stop.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            probe_lags.append(time.perf_counter() - started - interval)
+
+    async def interaction(i):
+        # All N interactions arrive together, so latency counts time spent waiting behind others
+        args = (f"Trader{i}", 'SOL', 10.0 + i, 15.0 + i, FIXED_PRICE, background)
+        if executor is None:
+            render_card(*args)
+        else:
+            await executor.run(render_card, *args)
+        return time.perf_counter() - started
+
+    probe_task = asyncio.create_task(probe())
+    await asyncio.sleep(0.05)
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(interaction(i) for i in range(concurrency)))
+    stop.set()
+    await probe_task
+    return latencies, probe_lags
+
+
+async def run_latency(levels, kinds, workers):
+    print(f"{'mode':<10} {'N':>4} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'max loop lag ms':>16}")
+    for kind in kinds:
+        executor = None
+        if kind != 'inline':
+            executor = RenderExecutor(kind=kind, workers=workers, max_pending=max(levels))
+            # Warm the pool so worker start-up is not counted as render latency
+            await executor.run(render_card, 'warmup', 'SOL', 1.0, 1.0, FIXED_PRICE, find_background())
+        for n in levels:
+            latencies, lags = await simulate_interactions(n, executor)
+            print(f"{kind:<10} {n:>4} {percentile(latencies, 50) * 1000:>9.1f} {percentile(latencies, 95) * 1000:>9.1f} "
+                  f"{max(latencies) * 1000:>9.1f} {max(lags, default=0.0) * 1000:>16.1f}")
+        if executor is not None:
+            executor.shutdown()
+
+
+def run_template(cards):
+    """Per-card CPU time of drawing, with every layer redrawn vs only the dynamic text"""
+    print(f"{'background':<12} {'mode':<22} {'mean ms':>9} {'p95 ms':>9}")
+    for label, background in (('custom', find_background()), ('generated', None)):
+        for mode in ('all layers per card', 'dynamic text only'):
+            samples = []
+            PNLCard('warmup', 'SOL', 1.0, 1.0, FIXED_PRICE, background).render_image()
+            for i in range(cards):
+                if mode == 'all layers per card':
+                    template_cache.clear()
+                card = PNLCard(f"Trader{i}", 'SOL', 10.0 + i, 15.0 + i, FIXED_PRICE, background)
+                started = time.process_time()
+                card.render_image()
+                samples.append(time.process_time() - started)
+            print(f"{label:<12} {mode:<22} {sum(samples) / len(samples) * 1000:>9.2f} {percentile(samples, 95) * 1000:>9.2f}")
+
+
+def run_encoders(repeats):
+    """Encode time and upload size of every encoder on the shipped background"""
+    image = PNLCard('CryptoHawk', 'SOL', 10.0, 15.0, FIXED_PRICE, find_background()).render_image()
+    variants = [('png', {'png_compress_level': level}) for level in (0, 1, 3, 6, 9)]
+    variants += [(encoder, {}) for encoder in ENCODERS if encoder != 'png']
+
+    print(f"{'encoder':<16} {'mean ms':>9} {'p95 ms':>9} {'size KB':>9}")
+    defaults = dict(config.ENCODER)
+    for encoder, overrides in variants:
+        config.ENCODER.update(overrides)
+        results = [encode_image(image, encoder) for _ in range(repeats)]
+        config.ENCODER.update(defaults)
+        times = [r.encode_seconds for r in results]
+        label = f"png level {overrides['png_compress_level']}" if encoder == 'png' else encoder
+        print(f"{label:<16} {sum(times) / len(times) * 1000:>9.1f} {percentile(times, 95) * 1000:>9.1f} {results[0].size / 1024:>9.1f}")
+
+
+def run_backgrounds(variants):
+    """Cost of each generated background: built once, then a cache lookup per card"""
+    size = (config.DEFAULT_CARD_WIDTH, config.DEFAULT_CARD_HEIGHT)
+    print(f"{'seed':<6} {'generate ms':>12} {'cached us':>10} {'first card ms':>14}")
+    for seed in range(variants):
+        started = time.perf_counter()
+        generate_background(*size, seed=seed)
+        generated = time.perf_counter() - started
+        background = procedural_path(seed)
+        card = PNLCard('warmup', 'SOL', 1.0, 1.0, FIXED_PRICE, background)
+        card.load_background(*size)
+        started = time.perf_counter()
+        for _ in range(1000):
+            card.load_background(*size)
+        cached = (time.perf_counter() - started) / 1000
+        started = time.process_time()
+        PNLCard('CryptoHawk', 'SOL', 10.0, 15.0, FIXED_PRICE, background).render_image()
+        drawn = time.process_time() - started
+        print(f"{seed:<6} {generated * 1000:>12.1f} {cached * 1e6:>10.1f} {drawn * 1000:>14.2f}")
+
+
+def summarize(samples):
+    """Mean and tail percentiles in milliseconds"""
+    return {
+        'mean_ms': sum(samples) / len(samples) * 1000,
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p95_ms': percentile(samples, 95) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+        'samples': len(samples)
+    }
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+def time_phases(background, iterations):
+    """Cold background load, font load, template build, dynamic text and encode, timed separately"""
+    width, height = config.DEFAULT_CARD_WIDTH, config.DEFAULT_CARD_HEIGHT
+    phases = {'background': [], 'fonts': [], 'template': [], 'text': [], 'encode': []}
+    for i in range(iterations):
+        card = PNLCard(f"Trader{i}", 'SOL', 10.0 + i, 15.0 + i, FIXED_PRICE, background)
+        background_cache.clear()
+        template_cache.clear()
+
+        started = time.perf_counter()
+        card.load_background(width, height)
+        phases['background'].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        FontRegistry().card_fonts()
+        phases['fonts'].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        card.load_template(width, height)
+        phases['template'].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        image = card.render_image()
+        phases['text'].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        encode_image(image)
+        phases['encode'].append(time.perf_counter() - started)
+    return {phase: summarize(samples) for phase, samples in phases.items()}
+
+
+def timed_render(args):
+    """Worker entry point: render one card end to end and return how long it took"""
+    started = time.perf_counter()
+    render_card(*args)
+    return time.perf_counter() - started
+
+
+def time_concurrency(background, max_workers, cards):
+    """Throughput and per-card latency with 1..N worker processes"""
+    results = []
+    for workers in range(1, max_workers + 1):
+        with ProcessPoolExecutor(max_workers=workers, initializer=preload_fonts) as pool:
+            # One warm-up card per worker so start-up is not measured
+            wait([pool.submit(timed_render, ('warmup', 'SOL', 1.0, 1.0, FIXED_PRICE, background)) for _ in range(workers)])
+            started = time.perf_counter()
+            futures = [pool.submit(timed_render, (f"Trader{i}", 'SOL', 10.0 + i, 15.0 + i, FIXED_PRICE, background))
+                       for i in range(cards)]
+            samples = [future.result() for future in futures]
+            elapsed = time.perf_counter() - started
+        results.append({'workers': workers, 'cards_per_sec': cards / elapsed, **summarize(samples)})
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(iterations, max_workers, cards, json_path):
+    """Full offline benchmark; prints a report and optionally writes JSON for comparing commits"""
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'pillow': PIL.__version__,
+            'cpu_count': os.cpu_count(),
+            'encoder': config.ENCODER['format'],
+            'sol_price': FIXED_PRICE
+        },
+        'phases': {},
+        'concurrency': {}
+    }
+    paths = {'custom': find_background(), 'generated': None}
+
+    print(f"{'background':<10} {'phase':<11} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for label, background in paths.items():
+        report['phases'][label] = time_phases(background, iterations)
+        for phase, stats in report['phases'][label].items():
+            print(f"{label:<10} {phase:<11} {stats['mean_ms']:>9.2f} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f}")
+
+    print(f"\n{'background':<10} {'workers':>7} {'cards/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for label, background in paths.items():
+        report['concurrency'][label] = time_concurrency(background, max_workers, cards)
+        for row in report['concurrency'][label]:
+            print(f"{label:<10} {row['workers']:>7} {row['cards_per_sec']:>9.1f} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} {row['p99_ms']:>9.2f}")
+
+    report['peak_rss_mb'] = {'main': peak_rss_mb(), 'largest_worker': peak_rss_mb(resource.RUSAGE_CHILDREN)}
+    print(f"\nPeak RSS: main {report['peak_rss_mb']['main']:.1f} MB, largest worker {report['peak_rss_mb']['largest_worker']:.1f} MB")
+
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Results written to {json_path}")
+
+
+def run_memory(budget_mb, cards):
+    """Render cards concurrently under a memory budget; returns 1 if peak RSS went over it"""
+    background = find_background()
+    plan = plan_for_cards(budget_mb * MB, background)
+    executor = RenderExecutor(max_pending=cards)
+    apply_budget(plan, executor, CardResultCache(disk_dir=''))
+    print(f"🧮 {plan.describe()}")
+
+    async def render_one(i):
+        # Keep only the size, like the bot which drops each card once it is uploaded
+        encoded = await executor.run(render_card, f"Trader{i}", 'SOL', 10.0 + i, 15.0 + i, FIXED_PRICE, background)
+        return encoded.size
+
+    async def render_all():
+        await executor.warm_up(warm_card_assets, background)
+        started = time.perf_counter()
+        await asyncio.gather(*(render_one(i) for i in range(cards)))
+        # Read the workers' peaks before the pool shuts down
+        return time.perf_counter() - started, tree_peak_rss_bytes()
+
+    try:
+        elapsed, peak = asyncio.run(render_all())
+    finally:
+        executor.shutdown()
+    within = peak <= budget_mb * MB
+    print(f"{'✅' if within else '❌'} {cards} concurrent cards in {elapsed:.2f}s, "
+          f"peak RSS {peak / MB:.1f} MB of {budget_mb} MB budget")
+    return 0 if within else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PNL card rendering")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    latency = subparsers.add_parser('latency', help="Interaction latency at N concurrent renders, inline vs executor")
+    latency.add_argument('--levels', type=int, nargs='+', default=[1, 4, 16])
+    latency.add_argument('--kinds', nargs='+', default=['inline', 'process', 'thread'],
+                         choices=['inline', 'process', 'thread'])
+    latency.add_argument('--workers', type=int, default=0, help="Pool size (0 = one per CPU core)")
+
+    template = subparsers.add_parser('template', help="Per-card CPU time with and without the cached template")
+    template.add_argument('--cards', type=int, default=50)
+
+    encoders = subparsers.add_parser('encoders', help="Encode time and size for each output format")
+    encoders.add_argument('--repeats', type=int, default=10)
+
+    backgrounds = subparsers.add_parser('backgrounds', help="Generation time of each procedural background and its cached per-card cost")
+    backgrounds.add_argument('--variants', type=int, default=config.PROCEDURAL_BACKGROUNDS['variants'])
+
+    suite = subparsers.add_parser('suite', help="Per-phase timings, concurrency scaling and peak RSS")
+    suite.add_argument('--iterations', type=int, default=30, help="Cards timed per phase and background")
+    suite.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    suite.add_argument('--cards', type=int, default=40, help="Cards rendered at each concurrency level")
+    suite.add_argument('--json', help="Write machine-readable results to this file")
+
+    memory = subparsers.add_parser('memory', help="Peak RSS while rendering cards concurrently under a memory budget")
+    memory.add_argument('--budget-mb', type=int, default=config.MEMORY_BUDGET['total_mb'] or 400)
+    memory.add_argument('--cards', type=int, default=100)
+
+    args = parser.parse_args()
+    if args.command == 'latency':
+        asyncio.run(run_latency(args.levels, args.kinds, args.workers or None))
+    elif args.command == 'template':
+        run_template(args.cards)
+    elif args.command == 'encoders':
+        run_encoders(args.repeats)
+    elif args.command == 'backgrounds':
+        run_backgrounds(args.variants)
+    elif args.command == 'suite':
+        run_suite(args.iterations, args.max_workers, args.cards, args.json)
+    elif args.command == 'memory':
+        sys.exit(run_memory(args.budget_mb, args.cards))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,271 +1,541 @@
+import time
+STARTED = time.perf_counter()  # Taken before the heavy imports so startup time includes them
 import discord
 from discord.ext import commands
 from discord import app_commands
 import os
 import asyncio
-from PIL import Image, ImageDraw, ImageFont
-import io
+import csv
 from typing import Optional
 import config
-import aiohttp
-import requests
+from backgrounds import background_cache, background_index
+from card import PNLCard, render_card, render_card_grid, render_leaderboard, render_summary, template_cache, warm_card_assets
+from fonts import font_registry
+from leaderboard import Leaderboard
+from live_cards import LiveCardManager
+from ledger import Trade, TradeLedger
+from memory_budget import MB, apply_budget, plan_for_cards
+from metrics import metrics
+from price_service import PricePrefetcher, PriceService, PriceUnavailable
+from render_executor import RenderExecutor, RenderQueueFull
+from render_server import RenderServer
+from result_cache import CardResultCache, background_version, card_cache_key, content_key, leaderboard_cache_key
+from scheduler import RenderScheduler, SchedulerBusy
+from shared_cache import SharedCacheClient
+from sharding import is_sharded, parse_shard_ids, shard_options
+from trade_input import parse_trade_file, parse_trade_text, trade_rows
+
+IMPORTED = time.perf_counter()
+
+# Several shards per process when SHARD_COUNT is set, e.g. by the launcher in sharding.py
+class PNLBot(commands.AutoShardedBot if is_sharded() else commands.Bot):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.warm = asyncio.Event()
+        self.warm_task = None
+        self.health_task = None
+
+    async def setup_hook(self):
+        # Index backgrounds once before connecting, then keep it fresh in the background
+        if not os.path.exists(config.BACKGROUNDS_FOLDER):
+            os.makedirs(config.BACKGROUNDS_FOLDER)
+        await asyncio.to_thread(background_index.refresh)
+        print(f'🖼️ Indexed {len(background_index)} background(s)')
+        # Size caches and the render pool to the memory budget before any worker starts
+        if config.MEMORY_BUDGET['total_mb']:
+            plan = await asyncio.to_thread(plan_for_cards, config.MEMORY_BUDGET['total_mb'] * MB, background_index.get())
+            apply_budget(plan, render_executor, result_cache)
+            print(f'🧮 {plan.describe()}')
+        self.background_rescan = asyncio.create_task(rescan_backgrounds())
+        if config.LEDGER['enabled']:
+            await ledger.start()
+            await asyncio.to_thread(leaderboard.load, ledger)
+        if config.RENDER_SERVER['enabled']:
+            await render_server.start()
+        if shared_cache is not None:
+            self.health_task = asyncio.create_task(report_shard_health())
+        await metrics.start()
+
+    async def warm_up(self):
+        """Load fonts, backgrounds and templates, start the render workers, then mark the bot warm"""
+        started = time.perf_counter()
+        try:
+            # Main-process caches load side by side on threads, default background first
+            paths = [background_index.get()] + [background_index.get(name) for name in background_index.names()]
+            paths = list(dict.fromkeys(paths))[:config.STARTUP['warm_backgrounds']]
+            await asyncio.gather(
+                asyncio.to_thread(font_registry.preload),
+                *(asyncio.to_thread(warm_card_assets, path) for path in paths)
+            )
+            # Workers start only after those threads finish, so a forked worker never
+            # inherits a held lock and begins with the default template already built
+            if config.STARTUP['warm_workers']:
+                await render_executor.warm_up(warm_card_assets, background_index.get())
+            print(f'🔥 Warm in {time.perf_counter() - started:.2f}s: {len(font_registry)} font(s), {len(paths)} background(s), {render_executor.workers} worker(s)')
+        except Exception as e:
+            print(f'❌ Warm-up failed, first cards will render cold: {e}')
+        finally:
+            metrics.set_gauge('pnl_startup_seconds', time.perf_counter() - started, phase='warm')
+            metrics.set_gauge('pnl_startup_seconds', time.perf_counter() - STARTED, phase='ready')
+            self.warm.set()
+
+    async def wait_until_warm(self, timeout: float) -> bool:
+        """Wait for warm-up to finish; False if it is still running after timeout seconds"""
+        try:
+            await asyncio.wait_for(self.warm.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def close(self):
+        if getattr(self, 'background_rescan', None):
+            self.background_rescan.cancel()
+        if self.warm_task is not None:
+            self.warm_task.cancel()
+        if self.health_task is not None:
+            self.health_task.cancel()
+        await live_cards.stop()
+        await price_prefetcher.stop()
+        await price_service.close()
+        try:
+            await ledger.close()
+        except Exception as e:
+            print(f"❌ Failed to write {ledger.pending} pending trade(s) to the ledger on shutdown: {e}")
+        await render_server.stop()
+        await metrics.stop()
+        if shared_cache is not None:
+            await shared_cache.close()
+        render_executor.shutdown(wait=False)
+        await super().close()
 
 # Bot setup
 intents = discord.Intents.default()
 intents.message_content = True
-bot = commands.Bot(command_prefix=config.COMMAND_PREFIX, intents=intents)
+bot = PNLBot(command_prefix=config.COMMAND_PREFIX, intents=intents, **shard_options())
+price_service = PriceService()
+price_prefetcher = PricePrefetcher(price_service)
+render_executor = RenderExecutor()
+live_cards = LiveCardManager(price_service, render_executor)
+result_cache = CardResultCache()
+scheduler = RenderScheduler()
+ledger = TradeLedger()
+leaderboard = Leaderboard()
+render_server = RenderServer(render_executor, result_cache, price_service)
+
+# Shard processes started by the launcher share quotes and cards through it
+shared_cache = SharedCacheClient() if config.SHARDING['socket'] else None
+price_service.shared = result_cache.shared = shared_cache
+
+# Scrape-time gauges and counters: evaluated only when /metrics is read
+metrics.gauge_callback('pnl_render_queue_depth', lambda: render_executor.queue_depth)
+metrics.gauge_callback('pnl_scheduler_queued', lambda: scheduler.queued)
+metrics.gauge_callback('pnl_scheduler_running', lambda: scheduler.running)
+metrics.counter_callback('pnl_scheduler_coalesced_total', lambda: scheduler.coalesced)
+metrics.counter_callback('pnl_scheduler_shed_total', lambda: scheduler.shed)
+metrics.counter_callback('pnl_card_cache_hits_total', lambda: result_cache.hits + result_cache.disk_hits + result_cache.shared_hits)
+metrics.counter_callback('pnl_card_cache_misses_total', lambda: result_cache.misses)
+metrics.gauge_callback('pnl_card_cache_hit_ratio', lambda: result_cache.stats()['hit_rate'])
+metrics.gauge_callback('pnl_card_cache_bytes', lambda: result_cache.current_bytes)
+metrics.gauge_callback('pnl_background_cache_bytes', lambda: background_cache.current_bytes)
+metrics.gauge_callback('pnl_template_cache_bytes', lambda: template_cache.current_bytes)
+metrics.counter_callback('pnl_price_upstream_requests_total', lambda: price_service.upstream_requests)
+metrics.counter_callback('pnl_price_stale_served_total', lambda: price_service.stale_served)
+metrics.gauge_callback('pnl_live_cards', lambda: len(live_cards))
+metrics.counter_callback('pnl_live_card_edits_total', lambda: live_cards.edits)
+metrics.counter_callback('pnl_http_requests_total', lambda: render_server.requests)
+metrics.counter_callback('pnl_http_not_modified_total', lambda: render_server.not_modified)
 
 async def get_solana_price():
-    """Get current Solana price from CoinGecko API"""
+    """Get current Solana price from the shared, cached price service"""
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get('https://api.coingecko.com/api/v3/simple/price?ids=solana&vs_currencies=usd') as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return data['solana']['usd']
-                else:
-                    # Fallback to synchronous request
-                    fallback_response = requests.get('https://api.coingecko.com/api/v3/simple/price?ids=solana&vs_currencies=usd')
-                    if fallback_response.status_code == 200:
-                        return fallback_response.json()['solana']['usd']
-                    else:
-                        return 100.0  # Fallback price
-    except Exception as e:
+        return await price_service.get_price('solana')
+    except PriceUnavailable as e:
         print(f"Error fetching Solana price: {e}")
-        return 100.0  # Fallback price
+        return config.FALLBACK_SOL_PRICE  # Fallback price
 
-class PNLCard:
-    def __init__(self, username: str, coin_name: str, bought_sol: float, sold_sol: float, sol_price: float, background_path: str = None):
-        self.username = username
-        self.coin_name = coin_name.upper()
-        self.bought_sol = bought_sol
-        self.sold_sol = sold_sol
-        self.sol_price = sol_price
-        self.background_path = background_path or f"{config.BACKGROUNDS_FOLDER}/default.jpg"
-        
-        # Calculate dollar values
-        self.bought_usd = bought_sol * sol_price
-        self.sold_usd = sold_sol * sol_price
-        
-        # Calculate profit/loss in both SOL and USD
-        self.pnl_sol = sold_sol - bought_sol
-        self.pnl_usd = self.pnl_sol * sol_price
-        self.is_profit = self.pnl_sol > 0
-        
-    def generate_card(self) -> io.BytesIO:
-        """Generate the futuristic PNL card image"""
-        # Create base image
-        width, height = config.DEFAULT_CARD_WIDTH, config.DEFAULT_CARD_HEIGHT
-        
-        # Try to load custom background image, otherwise create default
-        try:
-            if os.path.exists(self.background_path):
-                bg_img = Image.open(self.background_path)
-                bg_img = bg_img.resize((width, height), Image.Resampling.LANCZOS)
-            else:
-                # Create default cyberpunk background
-                bg_img = self.create_cyberpunk_background(width, height)
-        except:
-            bg_img = self.create_cyberpunk_background(width, height)
-        
-        draw = ImageDraw.Draw(bg_img)
-        
-        # Load fonts with fallbacks
+async def get_coin_price(coin_name: str) -> Optional[float]:
+    """USD price of the traded coin, or None if the symbol is unknown or unpriced"""
+    coin_id = price_service.resolve(coin_name)
+    if coin_id is None:
+        return None
+    try:
+        return await price_service.get_price(coin_id)
+    except PriceUnavailable:
+        return None
+
+async def rescan_backgrounds():
+    """Pick up added, removed or edited backgrounds without touching the request path"""
+    while True:
+        await asyncio.sleep(config.BACKGROUND_INDEX['rescan_interval'])
         try:
-            primary_font = config.FONTS['primary_font']
-            header_font = ImageFont.truetype(primary_font, config.FONTS['sizes']['header'])
-            label_font = ImageFont.truetype(primary_font, config.FONTS['sizes']['label'])
-            value_font = ImageFont.truetype(primary_font, config.FONTS['sizes']['value'])
-            small_font = ImageFont.truetype(primary_font, config.FONTS['sizes']['small'])
-            large_font = ImageFont.truetype(primary_font, config.FONTS['sizes']['large'])
-        except:
-            # Fallback to default fonts if custom font fails
-            header_font = ImageFont.load_default()
-            label_font = ImageFont.load_default()
-            value_font = ImageFont.load_default()
-            small_font = ImageFont.load_default()
-            large_font = ImageFont.load_default()
-        
-        # Colors - bright for first 2 sections, pale for rest
-        cyan = (0, 255, 255)          # Bright cyan for coin name and profit
-        white = (255, 255, 255)       # Bright white for coin name and profit
-        pale_gray = (120, 120, 120)   # Pale gray for other sections  
-        gray = (150, 150, 150)        # Regular gray for USD values
-        green = (0, 255, 100)         # Bright green for profit
-        red = (255, 50, 50)
-        ocean_blue = (30, 60, 120) 
-        dolar = (44,44,44)
-        
-        # Draw corner brackets
-        self.draw_corner_brackets(draw, width, height, cyan)
-        
-        
-        # Left side info
-        left_x = 100
-        
-        # Y positions for easy adjustment
-        y_coin = 130
-        y_profit = 192
-        y_profit_usd = 225
-        y_bought = 287
-        y_bought_usd = 320
-        y_sold = 382
-        y_sold_usd = 415
-        y_user = 472
-        y_bottom = 505
-        
-        # Coin name (replacing "> NO")
-        draw.text((left_x, y_coin), f"> {self.coin_name}", fill=white, font=label_font)
-        
-        # Profit/Loss section (bright)
-        pnl_sol_abs = abs(self.pnl_sol)
-        if pnl_sol_abs >= 1000:
-            pnl_sol_formatted = f"{pnl_sol_abs/1000:.1f}K"
-        else:
-            pnl_sol_formatted = f"{pnl_sol_abs:.1f}"
-        
-        profit_text = f"PROFIT: +{pnl_sol_formatted} SOL" if self.is_profit else f"LOSS: -{pnl_sol_formatted} SOL"
-        profit_color = cyan if self.is_profit else red
-        draw.text((left_x, y_profit), profit_text, fill=profit_color, font=large_font)
-        # Format profit USD value
-        pnl_usd_abs = abs(self.pnl_usd)
-        pnl_usd_formatted = f"{pnl_usd_abs/1000:.1f}K" if pnl_usd_abs >= 1000 else f"{pnl_usd_abs:.1f}"
-        draw.text((left_x, y_profit_usd), f"> ${pnl_usd_formatted}", fill=cyan, font=small_font)
-        
-        # Bought section (pale)
-        draw.text((left_x, y_bought), f"BOUGHT: {self.bought_sol:.1f} SOL", fill=pale_gray, font=value_font)
-        # Format bought USD value
-        bought_usd_formatted = f"{self.bought_usd/1000:.1f}K" if self.bought_usd >= 1000 else f"{self.bought_usd:.1f}"
-        draw.text((left_x, y_bought_usd), f"> ${bought_usd_formatted}", fill=dolar, font=small_font)
-        
-        # Sold section (pale)
-        draw.text((left_x, y_sold), f"SOLD: {self.sold_sol:.1f} SOL", fill=pale_gray, font=value_font)
-        # Format sold USD value
-        sold_usd_formatted = f"{self.sold_usd/1000:.1f}K" if self.sold_usd >= 1000 else f"{self.sold_usd:.1f}"
-        draw.text((left_x, y_sold_usd), f"> ${sold_usd_formatted}", fill=dolar, font=small_font)
-        
-        
-        # User section (pale)
-        draw.text((left_x, y_user), f"USER: {self.username.upper()}", fill=pale_gray, font=value_font)
-        draw.text((left_x, y_bottom), "> SRCL", fill=dolar, font=small_font)
-        
-        # Bottom text
-        
-        # Convert to bytes
-        output = io.BytesIO()
-        bg_img.save(output, format='PNG')
-        output.seek(0)
-        
-        return output
-    
-    def create_cyberpunk_background(self, width: int, height: int) -> Image.Image:
-        """Create a cyberpunk-themed background"""
-        # Create dark background with gradient effect
-        img = Image.new('RGB', (width, height), color=(15, 25, 35))  # Dark blue-gray
-        draw = ImageDraw.Draw(img)
-        
-        # Add subtle grid pattern
-        grid_color = (25, 35, 45)
-        for x in range(0, width, 40):
-            draw.line([(x, 0), (x, height)], fill=grid_color, width=1)
-        for y in range(0, height, 40):
-            draw.line([(0, y), (width, y)], fill=grid_color, width=1)
-        
-        # Add cyan accents
-        accent_color = (0, 100, 120)
-        draw.rectangle([10, 10, width-10, height-10], outline=accent_color, width=2)
-        
-        return img
-    
-    def draw_corner_brackets(self, draw, width: int, height: int, color):
-        """Draw cyberpunk corner brackets"""
-        bracket_size = 30
-        bracket_width = 3
-        
-        # Top-left bracket
-        draw.line([(20, 20), (20 + bracket_size, 20)], fill=color, width=bracket_width)
-        draw.line([(20, 20), (20, 20 + bracket_size)], fill=color, width=bracket_width)
-        
-        # Top-right bracket  
-        draw.line([(width - 20, 20), (width - 20 - bracket_size, 20)], fill=color, width=bracket_width)
-        draw.line([(width - 20, 20), (width - 20, 20 + bracket_size)], fill=color, width=bracket_width)
-        
-        # Bottom-left bracket
-        draw.line([(20, height - 20), (20 + bracket_size, height - 20)], fill=color, width=bracket_width)
-        draw.line([(20, height - 20), (20, height - 20 - bracket_size)], fill=color, width=bracket_width)
-        
-        # Bottom-right bracket
-        draw.line([(width - 20, height - 20), (width - 20 - bracket_size, height - 20)], fill=color, width=bracket_width)
-        draw.line([(width - 20, height - 20), (width - 20, height - 20 - bracket_size)], fill=color, width=bracket_width)
+            if await asyncio.to_thread(background_index.refresh):
+                print(f'🖼️ Backgrounds changed, indexed {len(background_index)}')
+        except Exception as e:
+            print(f'❌ Failed to rescan backgrounds: {e}')
 
 @bot.event
 async def on_ready():
     print(f'{bot.user} has landed on the trading seas!')
     
-    # Create backgrounds directory if it doesn't exist
-    if not os.path.exists(config.BACKGROUNDS_FOLDER):
-        os.makedirs(config.BACKGROUNDS_FOLDER)
+    # Warm caches and workers once; on_ready fires again after every reconnect
+    if bot.warm_task is None:
+        metrics.set_gauge('pnl_startup_seconds', IMPORTED - STARTED, phase='import')
+        metrics.set_gauge('pnl_startup_seconds', time.perf_counter() - STARTED, phase='connect')
+        bot.warm_task = asyncio.create_task(bot.warm_up())
+    
+    # Keep quotes warm so /pnl reads prices from memory (no-op if already running after a reconnect)
+    if config.PRICE_PREFETCH['enabled']:
+        price_prefetcher.start()
     
-    # Sync slash commands
+    # Sync slash commands once per bot, from the process that runs shard 0
+    shard_ids = parse_shard_ids(config.SHARDING['shard_ids'])
+    if shard_ids is not None and 0 not in shard_ids:
+        return
     try:
         synced = await bot.tree.sync()
         print(f'⚡ Synced {len(synced)} slash command(s)')
     except Exception as e:
         print(f'❌ Failed to sync slash commands: {e}')
 
+async def report_shard_health():
+    """Send this process's event-loop lag and gateway state to the launcher"""
+    interval = config.SHARDING['health_interval']
+    probe = config.METRICS['loop_lag_interval']
+    label = config.SHARDING['shard_ids'] or 'all'
+    while True:
+        # Sample lag often and report the worst, so short stalls are not missed
+        lag = worst = 0.0
+        for _ in range(max(1, int(interval / probe))):
+            started = time.perf_counter()
+            await asyncio.sleep(probe)
+            lag = max(0.0, time.perf_counter() - started - probe)
+            worst = max(worst, lag)
+        latencies = bot.latencies if is_sharded() else [(0, bot.latency)]
+        await shared_cache.report_health(label, {
+            'pid': os.getpid(),
+            'ready': bot.is_ready(),
+            'loop_lag': lag,
+            'loop_lag_max': worst,
+            'latencies': {shard: latency for shard, latency in latencies if latency == latency and latency != float('inf')},
+            'guilds': len(bot.guilds),
+            'render_queue': render_executor.queue_depth
+        })
+
+def pnl_embed(pnl_card: PNLCard, coin_price: Optional[float], live: bool = False) -> discord.Embed:
+    """Private /pnl embed for a card at its SOL price"""
+    embed = discord.Embed(
+        title="🔒 Private Trading Report",
+        description="This PNL card is only visible to you!",
+        color=0x00ff00 if pnl_card.is_profit else 0xff0000
+    )
+    embed.add_field(name="Trader", value=pnl_card.username, inline=True)
+    embed.add_field(name="SOL Price", value=f"${pnl_card.sol_price:.2f}", inline=True)
+    if coin_price is not None and pnl_card.coin_name != 'SOL':
+        embed.add_field(name=f"{pnl_card.coin_name} Price", value=f"${coin_price:,.8g}", inline=True)
+    # Format P&L for Discord embed
+    pnl_sol_abs = abs(pnl_card.pnl_sol)
+    pnl_sol_formatted = f"{pnl_sol_abs/1000:.1f}K" if pnl_sol_abs >= 1000 else f"{pnl_sol_abs:.1f}"
+    pnl_usd_abs = abs(pnl_card.pnl_usd)
+    pnl_usd_formatted = f"{pnl_usd_abs/1000:.1f}K" if pnl_usd_abs >= 1000 else f"{pnl_usd_abs:.2f}"
+    embed.add_field(name="P&L", value=f"{'+' if pnl_card.is_profit else '-'}{pnl_sol_formatted} {pnl_card.coin_name} (${pnl_usd_formatted})", inline=False)
+    if live:
+        embed.set_footer(text=f"🔴 Live: USD values follow the SOL price for {config.LIVE_CARDS['duration'] // 60} min")
+    return embed
+
+IMAGE_FORMAT_CHOICES = [
+    app_commands.Choice(name='PNG', value='png'),
+    app_commands.Choice(name='WebP (smaller)', value='webp'),
+    app_commands.Choice(name='WebP lossless', value='webp_lossless'),
+    app_commands.Choice(name='JPEG', value='jpeg')
+]
+
+async def defer_until_warm(interaction: discord.Interaction, trace, ephemeral: bool = True) -> bool:
+    """During warm-up, acknowledge the interaction and wait for warm-up rather than render cold; True if deferred"""
+    if bot.warm.is_set():
+        return False
+    with trace.phase('defer'):
+        await interaction.response.defer(ephemeral=ephemeral)
+    with trace.phase('warm_wait'):
+        await bot.wait_until_warm(config.STARTUP['warm_timeout'])
+    return True
+
+async def build_card(trace, username: str, coin_name: str, bought_amount: float, sold_amount: float, background_path: Optional[str], encoder: Optional[str]):
+    """Price and render one card, reusing the result cache; returns (SOL price, coin price, encoded card, cache hit)"""
+    # Fetch current Solana and coin prices together so they share one upstream request,
+    # rounded so repeated requests share a cached card
+    with trace.phase('price'):
+        sol_price, coin_price = await asyncio.gather(get_solana_price(), get_coin_price(coin_name))
+        sol_price = round(sol_price, config.RESULT_CACHE['price_decimals'])
+    
+    # Identical requests at the same price reuse the encoded card
+    cache_key = card_cache_key(username, coin_name, bought_amount, sold_amount, sol_price, background_path, None, encoder)
+    encoded = await result_cache.aget(cache_key)
+    if encoded is not None:
+        return sol_price, coin_price, encoded, True
+    
+    # Render in the worker pool so the gateway loop keeps running
+    with trace.phase('render'):
+        encoded = await render_executor.run(render_card, username, coin_name, bought_amount, sold_amount, sol_price, background_path, encoder=encoder)
+    trace.record('encode', encoded.encode_seconds)
+    await result_cache.aput(cache_key, encoded)
+    return sol_price, coin_price, encoded, False
+
 @bot.tree.command(name='pnl', description='Create a custom PNL trading card')
 @app_commands.describe(
     username='Your username/trader name',
     coin_name='The coin symbol (e.g., SOL, BTC, ETH)',
     bought_amount='How much of the coin you bought',
-    sold_amount='How much of the coin you sold'
+    sold_amount='How much of the coin you sold',
+    image_format='Image format (default set by the bot owner)',
+    background='Background image name',
+    live='Keep the USD values updating with the SOL price for a few minutes'
 )
-async def slash_pnl(interaction: discord.Interaction, username: str, coin_name: str, bought_amount: float, sold_amount: float):
+@app_commands.choices(image_format=IMAGE_FORMAT_CHOICES)
+async def slash_pnl(interaction: discord.Interaction, username: str, coin_name: str, bought_amount: float, sold_amount: float, image_format: Optional[app_commands.Choice[str]] = None, background: Optional[str] = None, live: bool = False):
     """Create a Solana PNL card with direct input"""
     
+    trace = metrics.start_trace('pnl', user_id=interaction.user.id)
+    
+    # Create PNL card with custom background from the prebuilt index
+    background_path = background_index.get(background)
+    if background and background_path is None:
+        names = ', '.join(background_index.names()) or 'none'
+        await interaction.response.send_message(f"❌ Unknown background '{background}'. Available: {names}", ephemeral=True)
+        trace.finish('unknown_background')
+        return
+    encoder = image_format.value if image_format else None
+    
+    deferred = await defer_until_warm(interaction, trace)
+    
+    # Admission control: identical in-flight requests share one render, and an
+    # overloaded bot answers right away instead of letting the interaction expire
+    request_key = (username, coin_name.upper(), bought_amount, sold_amount, background_path, encoder)
+    async def produce():
+        # Runs once per coalesced request, so a double-submitted trade is recorded once
+        result = await build_card(trace, username, coin_name, bought_amount, sold_amount, background_path, encoder)
+        if config.LEDGER['enabled']:
+            trade = Trade(interaction.guild_id or 0, interaction.user.id, username, coin_name.upper(),
+                          bought_amount, sold_amount, result[0])
+            ledger.record(trade)
+            leaderboard.add(trade)
+        return result
+    
+    try:
+        job = scheduler.submit(interaction.user.id, request_key, produce)
+    except SchedulerBusy:
+        reply = interaction.followup.send if deferred else interaction.response.send_message
+        await reply("⏳ The bot is busy rendering other cards, please try again in a moment.", ephemeral=True)
+        trace.finish('shed')
+        return
+    
     try:
         # Acknowledge the interaction first (ephemeral = private)
-        await interaction.response.defer(ephemeral=True)
-        
-        # Fetch current Solana price
-        sol_price = await get_solana_price()
-        
-        # Create PNL card with custom background
-        # Look for any image file in backgrounds folder
-        background_path = None
-        if os.path.exists(config.BACKGROUNDS_FOLDER):
-            for file in os.listdir(config.BACKGROUNDS_FOLDER):
-                if file.lower().endswith(('.png', '.jpg', '.jpeg')) and not file.startswith('.'):
-                    background_path = f"{config.BACKGROUNDS_FOLDER}/{file}"
-                    break
+        if not deferred:
+            with trace.phase('defer'):
+                await interaction.response.defer(ephemeral=True)
         
+        sol_price, coin_price, encoded, cache_hit = await job
         pnl_card = PNLCard(username, coin_name, bought_amount, sold_amount, sol_price, background_path)
-        card_image = pnl_card.generate_card()
         
         # Create Discord file
-        discord_file = discord.File(card_image, filename=f"{username}_{coin_name.lower()}_pnl.png")
+        filename = f"{username}_{coin_name.lower()}_pnl.{encoded.extension}"
+        discord_file = discord.File(encoded.open(), filename=filename)
         
         # Send the card with embed (ephemeral = private)
+        live = live and config.LIVE_CARDS['enabled'] and live_cards.can_add(interaction.user.id)
+        embed = pnl_embed(pnl_card, coin_price, live)
+        with trace.phase('upload'):
+            message = await interaction.followup.send(embed=embed, file=discord_file, ephemeral=True, wait=live)
+        
+        if live:
+            async def edit(price, updated):
+                card = PNLCard(username, coin_name, bought_amount, sold_amount, price, background_path)
+                await message.edit(embed=pnl_embed(card, coin_price, True),
+                                   attachments=[discord.File(updated.open(), filename=filename)])
+            await live_cards.add(pnl_card, edit, interaction.user.id, encoder)
+        trace.finish('ok', cache_hit=cache_hit, bytes=encoded.size)
+        
+    except RenderQueueFull:
+        await interaction.followup.send("⏳ The bot is busy rendering other cards, please try again in a moment.", ephemeral=True)
+        trace.finish('busy')
+    except ValueError:
+        await interaction.followup.send("❌ Invalid input! Please use numbers for coin amounts.", ephemeral=True)
+        trace.finish('invalid')
+    except Exception as e:
+        await interaction.followup.send(f"❌ Error creating PNL card: {str(e)}", ephemeral=True)
+        trace.finish('error')
+
+@bot.tree.command(name='pnlbatch', description='Summarize several trades on one card')
+@app_commands.describe(
+    username='Your username/trader name',
+    trades='Trades as COIN BOUGHT SOLD separated by commas, e.g. "SOL 10 15, BONK 2 3"',
+    file='Or a CSV/JSONL file with coin, bought and sold columns',
+    layout='One summary card, or a sheet with a card per trade',
+    image_format='Image format (default set by the bot owner)'
+)
+@app_commands.choices(layout=[
+    app_commands.Choice(name='Summary card', value='summary'),
+    app_commands.Choice(name='Card grid', value='grid')
+], image_format=IMAGE_FORMAT_CHOICES)
+async def slash_pnlbatch(interaction: discord.Interaction, username: str, trades: Optional[str] = None, file: Optional[discord.Attachment] = None,
+                         layout: Optional[app_commands.Choice[str]] = None, image_format: Optional[app_commands.Choice[str]] = None):
+    """Price a list of trades once and render them as one image"""
+    trace = metrics.start_trace('pnlbatch', user_id=interaction.user.id)
+    settings = config.PNL_BATCH
+    
+    # Parse the trades before acknowledging, so mistakes get an instant private reply
+    try:
+        if file is not None:
+            if file.size > settings['max_file_bytes']:
+                raise ValueError(f"File is too large (max {settings['max_file_bytes'] // 1024} KB)")
+            parsed = parse_trade_file(await file.read(), file.filename, username)
+        elif trades:
+            parsed = parse_trade_text(trades, username)
+        else:
+            raise ValueError("Give your trades as text or attach a CSV/JSONL file")
+        if not parsed:
+            raise ValueError("No trades found")
+        if len(parsed) > settings['max_trades']:
+            raise ValueError(f"Too many trades ({len(parsed)}), the limit is {settings['max_trades']}")
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        await interaction.response.send_message(f"❌ {e}", ephemeral=True)
+        trace.finish('invalid')
+        return
+    
+    rows = trade_rows(parsed)
+    layout = layout.value if layout else 'summary'
+    encoder = image_format.value if image_format else None
+    background_path = background_index.get()
+    deferred = await defer_until_warm(interaction, trace)
+    
+    async def produce():
+        # One SOL quote prices every trade in the batch
+        with trace.phase('price'):
+            sol_price = round(await get_solana_price(), config.RESULT_CACHE['price_decimals'])
+        cache_key = content_key(['batch', layout, username, [list(row) for row in rows], sol_price,
+                                 background_version(background_path), config.DEFAULT_THEME], encoder)
+        encoded = await result_cache.aget(cache_key)
+        cache_hit = encoded is not None
+        if encoded is None:
+            render = render_card_grid if layout == 'grid' else render_summary
+            with trace.phase('render'):
+                encoded = await render_executor.run(render, username, rows, sol_price, background_path, encoder=encoder)
+            trace.record('encode', encoded.encode_seconds)
+            await result_cache.aput(cache_key, encoded)
+        
+        if config.LEDGER['enabled']:
+            for coin_name, bought, sold in rows:
+                trade = Trade(interaction.guild_id or 0, interaction.user.id, username, coin_name, bought, sold, sol_price)
+                ledger.record(trade)
+                leaderboard.add(trade)
+        return sol_price, encoded, cache_hit
+    
+    try:
+        job = scheduler.submit(interaction.user.id, ('batch', layout, username, tuple(rows), encoder), produce)
+    except SchedulerBusy:
+        reply = interaction.followup.send if deferred else interaction.response.send_message
+        await reply("⏳ The bot is busy rendering other cards, please try again in a moment.", ephemeral=True)
+        trace.finish('shed')
+        return
+    
+    try:
+        if not deferred:
+            with trace.phase('defer'):
+                await interaction.response.defer(ephemeral=True)
+        sol_price, encoded, cache_hit = await job
+        
+        pnl_sol = sum(sold - bought for _, bought, sold in rows)
         embed = discord.Embed(
-            title="🔒 Private Trading Report",
-            description="This PNL card is only visible to you!",
-            color=0x00ff00 if pnl_card.is_profit else 0xff0000
+            title="🔒 Private Trading Summary",
+            description=f"{len(rows)} trade(s), only visible to you!",
+            color=0x00ff00 if pnl_sol > 0 else 0xff0000
         )
         embed.add_field(name="Trader", value=username, inline=True)
-        embed.add_field(name=f"{coin_name.upper()} Price", value=f"${sol_price:.2f}", inline=True)
-        # Format P&L for Discord embed
-        pnl_sol_abs = abs(pnl_card.pnl_sol)
-        pnl_sol_formatted = f"{pnl_sol_abs/1000:.1f}K" if pnl_sol_abs >= 1000 else f"{pnl_sol_abs:.1f}"
-        pnl_usd_abs = abs(pnl_card.pnl_usd)
-        pnl_usd_formatted = f"{pnl_usd_abs/1000:.1f}K" if pnl_usd_abs >= 1000 else f"{pnl_usd_abs:.2f}"
-        embed.add_field(name="P&L", value=f"{'+' if pnl_card.is_profit else '-'}{pnl_sol_formatted} {coin_name.upper()} (${pnl_usd_formatted})", inline=False)
+        embed.add_field(name="SOL Price", value=f"${sol_price:.2f}", inline=True)
+        embed.add_field(name="Total P&L", value=f"{pnl_sol:+,.2f} SOL ({'+' if pnl_sol >= 0 else '-'}${abs(pnl_sol * sol_price):,.2f})", inline=False)
         
-        await interaction.followup.send(embed=embed, file=discord_file, ephemeral=True)
-        
-    except ValueError:
-        await interaction.followup.send("❌ Invalid input! Please use numbers for coin amounts.", ephemeral=True)
+        discord_file = discord.File(encoded.open(), filename=f"{username}_batch_{layout}.{encoded.extension}")
+        with trace.phase('upload'):
+            await interaction.followup.send(embed=embed, file=discord_file, ephemeral=True)
+        trace.finish('ok', cache_hit=cache_hit, trades=len(rows), bytes=encoded.size)
+    
+    except RenderQueueFull:
+        await interaction.followup.send("⏳ The bot is busy rendering other cards, please try again in a moment.", ephemeral=True)
+        trace.finish('busy')
     except Exception as e:
-        await interaction.followup.send(f"❌ Error creating PNL card: {str(e)}", ephemeral=True)
+        await interaction.followup.send(f"❌ Error creating summary card: {str(e)}", ephemeral=True)
+        trace.finish('error')
+
+@slash_pnl.autocomplete('background')
+async def background_autocomplete(interaction: discord.Interaction, current: str):
+    """Suggest indexed background names"""
+    current = current.lower()
+    return [app_commands.Choice(name=name, value=name) for name in background_index.names() if current in name][:25]
+
+@bot.tree.command(name='stats', description='Show your running totals from every /pnl card')
+async def slash_stats(interaction: discord.Interaction):
+    """Show the caller's recorded trade totals in this server"""
+    if not config.LEDGER['enabled']:
+        await interaction.response.send_message("❌ Trade history is disabled on this bot.", ephemeral=True)
+        return
+    
+    totals = await ledger.summary(interaction.guild_id or 0, interaction.user.id)
+    if totals is None:
+        await interaction.response.send_message("📭 No trades recorded yet, make a card with `/pnl` first!", ephemeral=True)
+        return
+    
+    embed = discord.Embed(
+        title="📒 Your Trading Totals",
+        description=f"Across {totals.trades} recorded trade(s)",
+        color=0x00ff00 if totals.pnl > 0 else 0xff0000
+    )
+    embed.add_field(name="Bought", value=f"{totals.bought:,.2f}", inline=True)
+    embed.add_field(name="Sold", value=f"{totals.sold:,.2f}", inline=True)
+    embed.add_field(name="Realized P&L", value=f"{totals.pnl:+,.2f} ({'+' if totals.pnl_usd >= 0 else '-'}${abs(totals.pnl_usd):,.2f})", inline=False)
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+@bot.tree.command(name='leaderboard', description='Top traders in this server by realized P&L')
+@app_commands.describe(window='Time window to rank over')
+@app_commands.choices(window=[
+    app_commands.Choice(name=f'Last {name}' if seconds else 'All time', value=name)
+    for name, seconds in config.LEADERBOARD['windows'].items()
+])
+async def slash_leaderboard(interaction: discord.Interaction, window: Optional[app_commands.Choice[str]] = None):
+    """Post the server leaderboard card, re-rendered only when the ranking changes"""
+    if not config.LEDGER['enabled']:
+        await interaction.response.send_message("❌ Trade history is disabled on this bot.", ephemeral=True)
+        return
+    
+    window = window.value if window else config.LEADERBOARD['default_window']
+    trace = metrics.start_trace('leaderboard', window=window)
+    
+    try:
+        if not await defer_until_warm(interaction, trace, ephemeral=False):
+            with trace.phase('defer'):
+                await interaction.response.defer()
+        
+        rows = leaderboard.top(interaction.guild_id or 0, window)
+        title = leaderboard.title(window)
+        background_path = background_index.get()
+        cache_key = leaderboard_cache_key(title, rows, background_path, None, None)
+        encoded = await result_cache.aget(cache_key)
+        cache_hit = encoded is not None
+        if encoded is None:
+            with trace.phase('render'):
+                encoded = await render_executor.run(render_leaderboard, title, rows, background_path)
+            await result_cache.aput(cache_key, encoded)
+        
+        discord_file = discord.File(encoded.open(), filename=f"leaderboard_{window}.{encoded.extension}")
+        with trace.phase('upload'):
+            await interaction.followup.send(file=discord_file)
+        trace.finish('ok', cache_hit=cache_hit, bytes=encoded.size)
+    
+    except RenderQueueFull:
+        await interaction.followup.send("⏳ The bot is busy rendering other cards, please try again in a moment.", ephemeral=True)
+        trace.finish('busy')
+    except Exception as e:
+        await interaction.followup.send(f"❌ Error creating leaderboard: {str(e)}", ephemeral=True)
+        trace.finish('error')
 
 @bot.tree.command(name='info', description='Show information about the PNL Card Bot')
 async def slash_info(interaction: discord.Interaction):
@@ -278,7 +548,25 @@ async def slash_info(interaction: discord.Interaction):
     
     embed.add_field(
         name="/pnl",
-        value="Create a **private** custom PNL card with direct input\nParameters:\n• username: Your trader name\n• coin_name: Coin symbol (SOL, BTC, etc.)\n• bought_amount: Amount you bought\n• sold_amount: Amount you sold",
+        value="Create a **private** custom PNL card with direct input\nParameters:\n• username: Your trader name\n• coin_name: Coin symbol (SOL, BTC, etc.)\n• bought_amount: Amount you bought\n• sold_amount: Amount you sold\n• live: Keep USD values updating for a few minutes",
+        inline=False
+    )
+    
+    embed.add_field(
+        name="/pnlbatch",
+        value="Several trades on one **private** card: type them as `SOL 10 15, BONK 2 3` or attach a CSV/JSONL file; pick a summary card or a grid of cards",
+        inline=False
+    )
+    
+    embed.add_field(
+        name="/stats",
+        value="Your running totals (bought, sold, realized P&L) from every `/pnl` card in this server",
+        inline=False
+    )
+    
+    embed.add_field(
+        name="/leaderboard",
+        value="Top traders in this server by realized P&L over the last 24 hours, 7 days or all time",
         inline=False
     )
     
@@ -294,6 +582,9 @@ async def slash_info(interaction: discord.Interaction):
         inline=False
     )
     
+    stats = result_cache.stats()
+    embed.set_footer(text=f"Card cache: {stats['hits'] + stats['disk_hits'] + stats['shared_hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%})")
+    
     await interaction.response.send_message(embed=embed, ephemeral=True)
 
 # Legacy commands for transition help
@@ -327,10 +618,14 @@ async def legacy_info(ctx):
     )
     await ctx.send(embed=embed)
 
-# Run the bot
-if __name__ == "__main__":
+def main():
+    """Run the bot until it is stopped"""
     if not config.DISCORD_TOKEN:
         print("❌ Please set DISCORD_TOKEN in your .env file")
         print("💡 Create a .env file with: DISCORD_TOKEN=your_bot_token_here")
     else:
-        bot.run(config.DISCORD_TOKEN) 
\ No newline at end of file
+        bot.run(config.DISCORD_TOKEN)
+
+# Run the bot
+if __name__ == "__main__":
+    main() 
\ No newline at end of file
@@ -0,0 +1,439 @@
+import io
+import os
+import time
+from dataclasses import dataclass
+from typing import Optional, Union
+from PIL import Image, ImageDraw
+import config
+from backgrounds import BackgroundCache, background_cache
+from fonts import font_registry
+from procedural import VERSION as PROCEDURAL_VERSION, generate_background, procedural_seed
+
+# Bump whenever the way cards are drawn changes, so cached cards are re-rendered
+LAYOUT_VERSION = 1
+
+# Left column x and the y position of every line, for easy adjustment
+LAYOUT = {
+    'left_x': 100,
+    'coin': 130,
+    'profit': 192,
+    'profit_usd': 225,
+    'bought': 287,
+    'bought_usd': 320,
+    'sold': 382,
+    'sold_usd': 415,
+    'user': 472,
+    'bottom': 505
+}
+
+# Constant text baked into the template: line -> (text, font role, theme color)
+STATIC_LABELS = {
+    'coin': ("> ", 'label', 'coin'),
+    'profit_usd': ("> $", 'small', 'profit'),
+    'bought': ("BOUGHT: ", 'value', 'muted'),
+    'bought_usd': ("> $", 'small', 'dim'),
+    'sold': ("SOLD: ", 'value', 'muted'),
+    'sold_usd': ("> $", 'small', 'dim'),
+    'user': ("USER: ", 'value', 'muted'),
+    'bottom': ("> SRCL", 'small', 'dim')
+}
+
+# Leaderboard card: a title line, then two lines per ranked member (name, then PnL)
+LEADERBOARD_LAYOUT = {
+    'left_x': 100,
+    'title': 100,
+    'first_row': 150,
+    'row_height': 54,
+    'pnl_offset': 25,
+    'rows': 8,
+    'name_chars': 16
+}
+
+# Batch summary card: a title, one line per trade, then the totals
+SUMMARY_LAYOUT = {
+    'left_x': 100,
+    'title': 100,
+    'first_row': 145,
+    'row_height': 30,
+    'rows': 8,
+    'bought': 400,
+    'sold': 432,
+    'profit': 472,
+    'profit_usd': 505,
+    'user': 545
+}
+
+# Backgrounds with brackets and static labels already drawn, per (background, theme)
+template_cache = BackgroundCache(max_bytes=config.TEMPLATE_CACHE['max_bytes'])
+
+# Live cards' price-independent layers, per card, in whichever process redraws their prices
+price_base_cache = BackgroundCache(max_bytes=config.LIVE_CARDS['base_cache_bytes'])
+
+# Output encoders selectable in config.ENCODER['format'] or per command
+ENCODERS = ('png', 'webp', 'webp_lossless', 'jpeg')
+
+
+class BufferReader(io.RawIOBase):
+    """Seekable read-only file over any bytes-like object, sharing its memory"""
+
+    def __init__(self, data):
+        self._view = memoryview(data).cast('B')
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        count = min(len(buffer), len(self._view) - self._position)
+        buffer[:count] = self._view[self._position:self._position + count]
+        self._position += count
+        return count
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: len(self._view)}[whence]
+        self._position = max(0, base + offset)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+
+@dataclass
+class EncodedCard:
+    """An encoded card image with what it cost to produce
+
+    data is bytes, or a read-only memoryview of shared memory when the card
+    was rendered in a worker process; use open() to read either without a copy.
+    """
+    data: Union[bytes, memoryview]
+    encoder: str
+    extension: str
+    encode_seconds: float
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+    def open(self) -> io.IOBase:
+        """A file object over the encoded bytes, e.g. for discord.File, that shares their memory"""
+        # BytesIO shares a bytes object until written to; anything else it would copy
+        return io.BytesIO(self.data) if isinstance(self.data, bytes) else BufferReader(self.data)
+
+
+def encoder_options(encoder: str):
+    """Pillow format name, file extension and save() options for an encoder"""
+    settings = config.ENCODER
+    if encoder == 'png':
+        return 'PNG', 'png', {'compress_level': settings['png_compress_level']}
+    if encoder == 'webp':
+        return 'WEBP', 'webp', {'quality': settings['webp_quality'], 'method': settings['webp_method']}
+    if encoder == 'webp_lossless':
+        return 'WEBP', 'webp', {'lossless': True, 'quality': settings['webp_quality'], 'method': settings['webp_method']}
+    if encoder == 'jpeg':
+        # 4:4:4 chroma keeps the thin colored text sharp
+        return 'JPEG', 'jpg', {'quality': settings['jpeg_quality'], 'subsampling': 0}
+    raise ValueError(f"Unknown encoder: {encoder} (choose from {', '.join(ENCODERS)})")
+
+
+def encode_image(img: Image.Image, encoder: str = None) -> EncodedCard:
+    """Encode a rendered card, timing the encode"""
+    encoder = encoder or config.ENCODER['format']
+    image_format, extension, options = encoder_options(encoder)
+    started = time.perf_counter()
+    output = io.BytesIO()
+    img.save(output, format=image_format, **options)
+    return EncodedCard(output.getvalue(), encoder, extension, time.perf_counter() - started)
+
+
+def format_k(value: float) -> str:
+    """Format an amount with one decimal, using K above 1000"""
+    return f"{value/1000:.1f}K" if value >= 1000 else f"{value:.1f}"
+
+
+class PNLCard:
+    def __init__(self, username: str, coin_name: str, bought_sol: float, sold_sol: float, sol_price: float, background_path: str = None, theme: str = None):
+        self.username = username
+        self.coin_name = coin_name.upper()
+        self.bought_sol = bought_sol
+        self.sold_sol = sold_sol
+        self.sol_price = sol_price
+        self.background_path = background_path or f"{config.BACKGROUNDS_FOLDER}/default.jpg"
+        self.theme_name = theme or config.DEFAULT_THEME
+        self.theme = config.THEMES[self.theme_name]
+
+        # Calculate dollar values
+        self.bought_usd = bought_sol * sol_price
+        self.sold_usd = sold_sol * sol_price
+
+        # Calculate profit/loss in both SOL and USD
+        self.pnl_sol = sold_sol - bought_sol
+        self.pnl_usd = self.pnl_sol * sol_price
+        self.is_profit = self.pnl_sol > 0
+
+    def generate_card(self, encoder: str = None) -> io.IOBase:
+        """Generate the futuristic PNL card image"""
+        # Shares the encoded bytes rather than copying them
+        return self.encode(encoder).open()
+
+    def encode(self, encoder: str = None) -> EncodedCard:
+        """Render and encode the card with the configured or given encoder"""
+        return encode_image(self.render_image(), encoder)
+
+    def render_image(self) -> Image.Image:
+        """Draw this card's dynamic text over a copy of the cached template"""
+        img = self.render_base()
+        self.draw_prices(img)
+        return img
+
+    def render_base(self) -> Image.Image:
+        """Template plus every line that does not depend on the SOL price"""
+        width, height = config.DEFAULT_CARD_WIDTH, config.DEFAULT_CARD_HEIGHT
+        bg_img = self.load_template(width, height).copy()
+        draw = ImageDraw.Draw(bg_img)
+        fonts = font_registry.card_fonts()
+        theme = self.theme
+
+        # Profit/Loss line has no static prefix since the label itself changes
+        pnl_sol_formatted = format_k(abs(self.pnl_sol))
+        profit_text = f"PROFIT: +{pnl_sol_formatted} SOL" if self.is_profit else f"LOSS: -{pnl_sol_formatted} SOL"
+        profit_color = theme['profit'] if self.is_profit else theme['loss']
+        draw.text((LAYOUT['left_x'], LAYOUT['profit']), profit_text, fill=profit_color, font=fonts['large'])
+
+        # Everything else is drawn right after its pre-rendered label
+        self.draw_after_label(draw, fonts, 'coin', self.coin_name)
+        self.draw_after_label(draw, fonts, 'bought', f"{self.bought_sol:.1f} SOL")
+        self.draw_after_label(draw, fonts, 'sold', f"{self.sold_sol:.1f} SOL")
+        self.draw_after_label(draw, fonts, 'user', self.username.upper())
+
+        return bg_img
+
+    def draw_prices(self, img: Image.Image):
+        """Draw the USD lines, the only ones that depend on the SOL price, onto a render_base() image"""
+        draw = ImageDraw.Draw(img)
+        fonts = font_registry.card_fonts()
+        self.draw_after_label(draw, fonts, 'profit_usd', format_k(abs(self.pnl_usd)))
+        self.draw_after_label(draw, fonts, 'bought_usd', format_k(self.bought_usd))
+        self.draw_after_label(draw, fonts, 'sold_usd', format_k(self.sold_usd))
+
+    def base_key(self, width: int, height: int) -> tuple:
+        """Cache key of render_base(): every input except the SOL price"""
+        source, version = self.template_source()
+        return (source, version, (width, height), self.theme_name, self.username, self.coin_name, self.bought_sol, self.sold_sol)
+
+    def draw_after_label(self, draw, fonts, line: str, text: str):
+        """Draw text on a layout line, offset past the label baked into the template"""
+        label, font_role, color = STATIC_LABELS[line]
+        font = fonts[font_role]
+        x = LAYOUT['left_x'] + font.getlength(label)
+        draw.text((x, LAYOUT[line]), text, fill=self.theme[color], font=font)
+
+    def load_background(self, width: int, height: int) -> Image.Image:
+        """Shared decoded background (copy before drawing on it)"""
+        seed = self.procedural_seed()
+        if seed is None:
+            try:
+                return background_cache.load(self.background_path, (width, height))
+            except Exception:
+                seed = config.PROCEDURAL_BACKGROUNDS['default_seed']
+        # Generated once per (theme, seed, size), then shared like a decoded file
+        return background_cache.generated(f"procedural:{self.theme_name}:{seed}", (width, height),
+                                          lambda w, h: generate_background(w, h, self.theme_name, seed))
+
+    def procedural_seed(self) -> Optional[int]:
+        """Seed of the generated background this card uses, or None when it uses an image file"""
+        seed = procedural_seed(self.background_path)
+        if seed is None and not os.path.exists(self.background_path):
+            # Missing files fall back to the default generated background
+            seed = config.PROCEDURAL_BACKGROUNDS['default_seed']
+        return seed
+
+    def load_template(self, width: int, height: int, labels: bool = True) -> Image.Image:
+        """Shared background with every constant layer drawn (copy before drawing on it)"""
+        source, version = self.template_source()
+        key = (source, version, (width, height), self.theme_name, labels)
+        return template_cache.get(key, lambda: self.build_template(width, height, labels), stale_prefix=source)
+
+    def template_source(self) -> tuple:
+        """(source, version) of the background under this card's template"""
+        seed = self.procedural_seed()
+        if seed is None:
+            try:
+                return os.path.abspath(self.background_path), os.stat(self.background_path).st_mtime_ns
+            except OSError:
+                seed = config.PROCEDURAL_BACKGROUNDS['default_seed']
+        return f'<procedural:{seed}>', PROCEDURAL_VERSION
+
+    def build_template(self, width: int, height: int, labels: bool = True) -> Image.Image:
+        """Render the background, corner brackets and (unless labels is False) static labels once"""
+        img = self.load_background(width, height).copy()
+        draw = ImageDraw.Draw(img)
+        fonts = font_registry.card_fonts()
+
+        # Draw corner brackets
+        self.draw_corner_brackets(draw, width, height, self.theme['brackets'])
+
+        if labels:
+            for line, (label, font_role, color) in STATIC_LABELS.items():
+                draw.text((LAYOUT['left_x'], LAYOUT[line]), label, fill=self.theme[color], font=fonts[font_role])
+
+        return img
+
+    def draw_corner_brackets(self, draw, width: int, height: int, color):
+        """Draw cyberpunk corner brackets"""
+        bracket_size = 30
+        bracket_width = 3
+
+        # Top-left bracket
+        draw.line([(20, 20), (20 + bracket_size, 20)], fill=color, width=bracket_width)
+        draw.line([(20, 20), (20, 20 + bracket_size)], fill=color, width=bracket_width)
+
+        # Top-right bracket
+        draw.line([(width - 20, 20), (width - 20 - bracket_size, 20)], fill=color, width=bracket_width)
+        draw.line([(width - 20, 20), (width - 20, 20 + bracket_size)], fill=color, width=bracket_width)
+
+        # Bottom-left bracket
+        draw.line([(20, height - 20), (20 + bracket_size, height - 20)], fill=color, width=bracket_width)
+        draw.line([(20, height - 20), (20, height - 20 - bracket_size)], fill=color, width=bracket_width)
+
+        # Bottom-right bracket
+        draw.line([(width - 20, height - 20), (width - 20 - bracket_size, height - 20)], fill=color, width=bracket_width)
+        draw.line([(width - 20, height - 20), (width - 20, height - 20 - bracket_size)], fill=color, width=bracket_width)
+
+
+class LeaderboardCard:
+    """Server ranking drawn over the same background and brackets as the PNL card"""
+
+    def __init__(self, title: str, rows: list, background_path: str = None, theme: str = None):
+        # rows: (name, pnl_sol, pnl_usd, trades), best first
+        self.title = title
+        self.rows = rows[:LEADERBOARD_LAYOUT['rows']]
+        self.base = PNLCard('', '', 0, 0, 0, background_path, theme)
+        self.theme = self.base.theme
+
+    def encode(self, encoder: str = None) -> EncodedCard:
+        return encode_image(self.render_image(), encoder)
+
+    def render_image(self) -> Image.Image:
+        width, height = config.DEFAULT_CARD_WIDTH, config.DEFAULT_CARD_HEIGHT
+        img = self.base.load_template(width, height, labels=False).copy()
+        draw = ImageDraw.Draw(img)
+        fonts = font_registry.card_fonts()
+        theme, layout = self.theme, LEADERBOARD_LAYOUT
+        left_x = layout['left_x']
+
+        draw.text((left_x, layout['title']), f"> {self.title}", fill=theme['coin'], font=fonts['label'])
+        if not self.rows:
+            draw.text((left_x, layout['first_row']), "NO TRADES YET", fill=theme['muted'], font=fonts['value'])
+        for rank, (name, pnl_sol, pnl_usd, trades) in enumerate(self.rows, 1):
+            y = layout['first_row'] + (rank - 1) * layout['row_height']
+            draw.text((left_x, y), f"#{rank:<3}{name.upper()[:layout['name_chars']]}", fill=theme['muted'], font=fonts['value'])
+            sign = '+' if pnl_sol > 0 else '-'
+            color = theme['profit'] if pnl_sol > 0 else theme['loss']
+            draw.text((left_x, y + layout['pnl_offset']), f"    {sign}{format_k(abs(pnl_sol))} SOL  {sign}${format_k(abs(pnl_usd))}",
+                      fill=color, font=fonts['small'])
+        return img
+
+
+def render_leaderboard(title: str, rows: list, background_path: str = None, theme: str = None, encoder: str = None) -> EncodedCard:
+    """Render and encode a leaderboard card (picklable for worker processes)"""
+    return LeaderboardCard(title, rows, background_path, theme).encode(encoder)
+
+
+class SummaryCard:
+    """Several trades and their totals on one card, over the PNL card's background and brackets"""
+
+    def __init__(self, username: str, trades: list, sol_price: float, background_path: str = None, theme: str = None):
+        # trades: (coin_name, bought_sol, sold_sol)
+        self.username = username
+        self.trades = trades
+        self.sol_price = sol_price
+        self.base = PNLCard(username, '', 0, 0, sol_price, background_path, theme)
+        self.theme = self.base.theme
+        self.bought_sol = sum(bought for _, bought, _ in trades)
+        self.sold_sol = sum(sold for _, _, sold in trades)
+        self.pnl_sol = self.sold_sol - self.bought_sol
+        self.pnl_usd = self.pnl_sol * sol_price
+        self.is_profit = self.pnl_sol > 0
+
+    def encode(self, encoder: str = None) -> EncodedCard:
+        return encode_image(self.render_image(), encoder)
+
+    def render_image(self) -> Image.Image:
+        width, height = config.DEFAULT_CARD_WIDTH, config.DEFAULT_CARD_HEIGHT
+        img = self.base.load_template(width, height, labels=False).copy()
+        draw = ImageDraw.Draw(img)
+        fonts = font_registry.card_fonts()
+        theme, layout = self.theme, SUMMARY_LAYOUT
+        left_x = layout['left_x']
+
+        draw.text((left_x, layout['title']), f"> BATCH // {len(self.trades)} TRADES", fill=theme['coin'], font=fonts['label'])
+
+        # With too many trades the last line says how many more there are
+        shown = self.trades if len(self.trades) <= layout['rows'] else self.trades[:layout['rows'] - 1]
+        for number, (coin_name, bought, sold) in enumerate(shown):
+            pnl = sold - bought
+            y = layout['first_row'] + number * layout['row_height']
+            sign, color = ('+', theme['profit']) if pnl > 0 else ('-', theme['loss'])
+            draw.text((left_x, y), f"{coin_name.upper()[:6]:<7}{sign}{format_k(abs(pnl))} SOL", fill=color, font=fonts['small'])
+        if len(shown) < len(self.trades):
+            y = layout['first_row'] + len(shown) * layout['row_height']
+            draw.text((left_x, y), f"... +{len(self.trades) - len(shown)} MORE", fill=theme['dim'], font=fonts['small'])
+
+        pnl_text = format_k(abs(self.pnl_sol))
+        profit_text = f"PROFIT: +{pnl_text} SOL" if self.is_profit else f"LOSS: -{pnl_text} SOL"
+        draw.text((left_x, layout['bought']), f"BOUGHT: {self.bought_sol:.1f} SOL", fill=theme['muted'], font=fonts['value'])
+        draw.text((left_x, layout['sold']), f"SOLD: {self.sold_sol:.1f} SOL", fill=theme['muted'], font=fonts['value'])
+        draw.text((left_x, layout['profit']), profit_text, fill=theme['profit'] if self.is_profit else theme['loss'], font=fonts['large'])
+        draw.text((left_x, layout['profit_usd']), f"> ${format_k(abs(self.pnl_usd))}", fill=theme['profit'], font=fonts['small'])
+        draw.text((left_x, layout['user']), f"USER: {self.username.upper()}", fill=theme['muted'], font=fonts['value'])
+        return img
+
+
+def render_summary(username: str, trades: list, sol_price: float, background_path: str = None, theme: str = None, encoder: str = None) -> EncodedCard:
+    """Render and encode a batch summary card (picklable for worker processes)"""
+    return SummaryCard(username, trades, sol_price, background_path, theme).encode(encoder)
+
+
+def render_card_grid(username: str, trades: list, sol_price: float, background_path: str = None, theme: str = None, encoder: str = None) -> EncodedCard:
+    """Draw one card per trade from the shared template, tile them into a sheet and encode it once"""
+    width, height = config.DEFAULT_CARD_WIDTH, config.DEFAULT_CARD_HEIGHT
+    scale = config.PNL_BATCH['grid_scale']
+    tile_width, tile_height = width // scale, height // scale
+    columns = min(len(trades), config.PNL_BATCH['grid_columns'])
+    rows = -(-len(trades) // columns)
+    sheet = Image.new('RGB', (columns * tile_width, rows * tile_height))
+    for number, (coin_name, bought, sold) in enumerate(trades):
+        card = PNLCard(username, coin_name, bought, sold, sol_price, background_path, theme)
+        tile = card.render_image().reduce(scale)
+        sheet.paste(tile, ((number % columns) * tile_width, (number // columns) * tile_height))
+    return encode_image(sheet, encoder)
+
+
+def warm_card_assets(background_path: str = None, theme: str = None) -> float:
+    """Load fonts, decode the background and build its template before the first card; returns seconds taken"""
+    started = time.perf_counter()
+    font_registry.preload()
+    PNLCard('', '', 0, 0, 0, background_path, theme).load_template(config.DEFAULT_CARD_WIDTH, config.DEFAULT_CARD_HEIGHT)
+    return time.perf_counter() - started
+
+
+def render_card_prices(username: str, coin_name: str, bought_sol: float, sold_sol: float, sol_price: float, background_path: str = None, theme: str = None, encoder: str = None) -> EncodedCard:
+    """Redraw a card's USD lines at sol_price over its cached base and encode it (picklable for worker processes)
+
+    The base holds every line that does not move with the price, so a live card's
+    edits only draw three lines once its base is cached in the worker.
+    """
+    card = PNLCard(username, coin_name, bought_sol, sold_sol, sol_price, background_path, theme)
+    key = card.base_key(config.DEFAULT_CARD_WIDTH, config.DEFAULT_CARD_HEIGHT)
+    img = price_base_cache.get(key, card.render_base, stale_prefix=key[0]).copy()
+    card.draw_prices(img)
+    return encode_image(img, encoder)
+
+
+def render_card(username: str, coin_name: str, bought_sol: float, sold_sol: float, sol_price: float, background_path: str = None, theme: str = None, encoder: str = None) -> EncodedCard:
+    """Render and encode a card (picklable for worker processes)"""
+    card = PNLCard(username, coin_name, bought_sol, sold_sol, sol_price, background_path, theme)
+    return card.encode(encoder)
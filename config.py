@@ -25,10 +25,30 @@ COLORS = {
     'frame': (101, 67, 33)        # Brown
 }
 
+# Card Themes - colors for every layer of the card
+THEMES = {
+    'cyberpunk': {
+        'coin': (255, 255, 255),     # Bright white coin name
+        'profit': (0, 255, 255),     # Bright cyan profit line and its USD value
+        'loss': (255, 50, 50),       # Red loss line
+        'muted': (120, 120, 120),    # Pale gray BOUGHT / SOLD / USER lines
+        'dim': (44, 44, 44),         # Dark USD values and footer
+        'brackets': (0, 255, 255),   # Corner brackets
+        'background': (15, 25, 35),  # Dark blue-gray base of generated backgrounds
+        'grid': (25, 35, 45),        # Their grid lines
+        'accent': (0, 100, 120),     # Their frame and gradient tint
+        'glow': ((0, 160, 200), (90, 40, 170), (0, 120, 90))  # Their glow colors, one picked per seed
+    }
+}
+DEFAULT_THEME = 'cyberpunk'
+
 # Font Settings
 FONTS = {
     'primary_font': 'fonts/ShareTechMono-Regular.ttf',     # Main font file (can be path to custom font)
     'fallback_font': None,           # Use default if None
+    'folder': 'fonts',               # Every font file here is preloaded at startup
+    'preload_folder': True,          # Turned off by the memory budget when the folder would not fit
+    'max_bytes': None,               # Cap on loaded font files, set by the memory budget (None = no cap)
     'sizes': {
         'header': 20,                # "MPH >< FNF" header (if used)
         'label': 24,                 # "> COIN_NAME"
@@ -36,4 +56,173 @@ FONTS = {
         'small': 24,                 # USD values and subtitles
         'large': 24                  # PROFIT/LOSS text
     }
-} 
\ No newline at end of file
+} 
+
+# Price Settings
+PRICE_API_URL = 'https://api.coingecko.com/api/v3/simple/price'
+PRICE_CACHE_TTL = float(os.getenv('PRICE_CACHE_TTL', '30'))   # Seconds a quote is reused before refetching
+FALLBACK_SOL_PRICE = 100.0                                    # Used only when no price was ever fetched
+PRICE_BATCH_WINDOW = 0.05                                     # Seconds to gather coins into one upstream request
+# Ticker symbol -> CoinGecko id; extend with a JSON file of {"SYMBOL": "coingecko-id"}
+COIN_IDS = {
+    'SOL': 'solana',
+    'BTC': 'bitcoin',
+    'ETH': 'ethereum',
+    'USDC': 'usd-coin',
+    'USDT': 'tether',
+    'BONK': 'bonk',
+    'WIF': 'dogwifcoin',
+    'JUP': 'jupiter-exchange-solana',
+    'PYTH': 'pyth-network',
+    'RAY': 'raydium',
+    'JTO': 'jito-governance-token',
+    'POPCAT': 'popcat',
+    'DOGE': 'dogecoin',
+    'PEPE': 'pepe'
+}
+COIN_IDS_FILE = os.getenv('COIN_IDS_FILE', '')
+PRICE_FETCH = {
+    'attempts': 3,                   # Tries per refresh before giving up
+    'attempt_timeout': 3.0,          # Seconds allowed for a single HTTP attempt
+    'backoff': 0.5,                  # First retry delay, doubled after each failure
+    'deadline': 8.0                  # Seconds allowed for the whole refresh, retries included
+}
+PRICE_PREFETCH = {
+    'enabled': os.getenv('PRICE_PREFETCH', '1') == '1',  # Keep active quotes warm in the background
+    'tick': 1.0,                     # Seconds between checks for quotes that are due
+    'min_interval': 20.0,            # Refresh interval for assets requested within hot_window (keep under PRICE_CACHE_TTL)
+    'max_interval': 300.0,           # Refresh interval ceiling for assets that have gone quiet
+    'hot_window': 120.0,             # Seconds since the last request during which an asset counts as hot
+    'forget_after': 3600.0,          # Stop refreshing assets nobody asked for in this long
+    'failure_backoff': 5.0,          # Wait after a failed refresh, doubled per further failure up to max_interval
+    'max_stale': 600.0               # Oldest quote served instantly while a refresh runs behind it
+}
+
+# Render Settings
+RENDER_EXECUTOR = {
+    'kind': os.getenv('RENDER_EXECUTOR', 'process'),   # 'process' pool, or 'thread' (Pillow releases the GIL)
+    'workers': int(os.getenv('RENDER_WORKERS', '0')),  # 0 = one worker per CPU core
+    'max_pending': 32,                                 # Renders queued or running before new ones are refused
+    'shared_memory': os.getenv('RENDER_SHARED_MEMORY', '1') == '1',  # Return worker cards via /dev/shm instead of pickling
+    'shared_memory_min_bytes': 32 * 1024                            # Smaller cards are cheaper to pickle
+}
+STARTUP = {
+    'warm_timeout': 15.0,            # Seconds a /pnl that arrives during warm-up waits before rendering cold
+    'warm_backgrounds': 8,           # Backgrounds whose templates are built before going ready
+    'warm_workers': True             # Start the render workers and build their templates before going ready
+}
+SCHEDULER = {
+    'global_limit': 8,               # /pnl cards being priced and rendered at once, across all users
+    'per_user_limit': 1,             # Cards one user can have rendering at once
+    'max_queued': 64,                # Waiting requests before new ones get an instant "busy" reply
+    'max_queued_per_user': 3         # Waiting requests per user before that user is told to slow down
+}
+BACKGROUND_INDEX = {
+    'default': 'background',         # Name (file name without extension) used when none is picked
+    'min_width': 594,                # Smaller images would look blurry once scaled up
+    'min_height': 334,
+    'aspect_tolerance': 0.1,         # Allowed aspect ratio difference from the card (10%)
+    'rescan_interval': 30            # Seconds between checks of the backgrounds folder for changes
+}
+
+# Generated Backgrounds - built from the theme's palette and a seed, no image files needed
+PROCEDURAL_BACKGROUNDS = {
+    'default_seed': 0,               # Used when no background file exists (0 is the classic grid)
+    'variants': 16                   # procedural-0 .. procedural-15 are offered as /pnl backgrounds
+}
+BACKGROUND_CACHE = {
+    'max_bytes': 64 * 1024 * 1024    # Decoded backgrounds kept in memory (one 1188x668 RGB image is ~2.4 MB)
+}
+ENCODER = {
+    'format': os.getenv('CARD_FORMAT', 'png'),   # 'png', 'webp', 'webp_lossless' or 'jpeg'
+    'png_compress_level': 6,                     # 0-9: higher is smaller but slower (6 is Pillow's default)
+    'webp_quality': 90,                          # Lossy quality, or effort when lossless
+    'webp_method': 4,                            # 0-6: higher is smaller but slower
+    'jpeg_quality': 92
+}
+TEMPLATE_CACHE = {
+    'max_bytes': 32 * 1024 * 1024    # Backgrounds with brackets and labels pre-drawn, per (background, theme)
+}
+RESULT_CACHE = {
+    'max_bytes': 32 * 1024 * 1024,                 # Encoded cards kept in memory
+    'disk_dir': os.getenv('CARD_CACHE_DIR', ''),   # Optional on-disk tier, disabled when empty
+    'disk_max_bytes': 256 * 1024 * 1024,           # Cap for the on-disk tier
+    'price_decimals': 2                            # Prices are rounded to this before keying and rendering
+}
+MEMORY_BUDGET = {
+    'total_mb': int(os.getenv('MEMORY_BUDGET_MB', '0')),  # 0 = off; e.g. 400 on a 512 MB instance
+    'reserve_mb': 48,                # Kept free for discord.py caches, gateway buffers and allocator slack
+    'cache_share': 0.3,              # Part of what is left after the baseline that goes to caches
+    'process_overhead_mb': 35,       # RSS of an idle render worker process (interpreter, Pillow, fonts)
+    'render_headroom': 1.5           # Safety factor on the measured per-render peak
+}
+PNL_BATCH = {
+    'max_trades': 24,                # Trades accepted by one /pnlbatch
+    'max_file_bytes': 64 * 1024,     # Largest CSV/JSONL attachment read
+    'grid_columns': 3,               # Cards per row on the grid sheet
+    'grid_scale': 2                  # Grid cards are 1/N of full size
+}
+LIVE_CARDS = {
+    'enabled': True,                 # Allow /pnl live:true
+    'duration': 600,                 # Seconds a live card keeps updating (interaction tokens expire after 15 min)
+    'tick': 15.0,                    # Seconds between price checks
+    'edits_per_second': 4.0,         # Message edits per second across every live card
+    'edit_burst': 4,
+    'max_cards': 50,                 # Live cards at once, across all users
+    'max_per_user': 2,
+    'base_cache_bytes': 24 * 1024 * 1024  # Price-independent card layers kept per render process for live edits
+}
+
+# Trade Ledger Settings
+LEDGER = {
+    'enabled': os.getenv('LEDGER_ENABLED', '1') == '1',           # Record every /pnl trade
+    'path': os.getenv('LEDGER_PATH', 'data/ledger.sqlite3'),    # SQLite database (WAL mode)
+    'batch_size': 500,               # Trades buffered before an early write
+    'flush_interval': 1.0,           # Seconds between background batch writes
+    'max_retry_delay': 60.0          # Failed writes are retried after 1s, 2s, 4s... up to this
+}
+LEADERBOARD = {
+    'windows': {                     # Window name -> seconds covered (None = all time)
+        '24h': 24 * 60 * 60,
+        '7d': 7 * 24 * 60 * 60,
+        'all': None
+    },
+    'default_window': '7d',
+    'size': 8                        # Members shown on the leaderboard card
+}
+
+# Sharding Settings
+SHARDING = {
+    'shard_count': os.getenv('SHARD_COUNT', ''),           # '' = one unsharded bot, 'auto' = Discord's recommendation, or a number
+    'shard_ids': os.getenv('SHARD_IDS', ''),               # Shards this process runs, e.g. '0-3' or '0,2'; '' = all of them
+    'processes': int(os.getenv('SHARD_PROCESSES', '1')),   # Bot processes run_bot.py starts, each with a range of shards
+    'socket': os.getenv('SHARED_CACHE_SOCKET', ''),        # Unix socket of the launcher's shared cache; set by the launcher
+    'shared_card_bytes': 128 * 1024 * 1024,                # Encoded cards the shared cache keeps for all shards
+    'cache_timeout': 0.5,            # Seconds a shard waits on the shared cache before going without it
+    'health_interval': 10.0,         # Seconds between each shard's health reports
+    'health_log_interval': 60.0,     # Seconds between the launcher's health summaries
+    'lag_warning': 0.25,             # Event-loop lag in seconds that the launcher warns about
+    'restart_delay': 5.0             # Seconds before the launcher restarts a shard process that exited
+}
+
+# Render Server Settings
+RENDER_SERVER = {
+    'enabled': os.getenv('RENDER_SERVER_ENABLED', '0') == '1',  # Also serve cards over HTTP while the bot runs
+    'host': '127.0.0.1',                                       # Only reachable from the machine itself
+    'port': int(os.getenv('RENDER_SERVER_PORT', '8088')),
+    'keepalive_timeout': 75.0,       # Seconds an idle client connection stays open for reuse
+    'backlog': 128,                  # Pending connections the listening socket accepts
+    'chunk_bytes': 64 * 1024,        # Response body is streamed in chunks of this size
+    'max_age': 86400,                # Cache-Control max-age for cards rendered at an explicit sol_price
+    'max_text_length': 32            # Longest username or coin name accepted
+}
+
+# Metrics Settings
+METRICS = {
+    'enabled': os.getenv('METRICS_ENABLED', '0') == '1',   # Off by default: instrumentation becomes no-ops
+    'host': '127.0.0.1',                                   # Only reachable from the machine itself
+    'port': int(os.getenv('METRICS_PORT', '9108')),
+    'trace_log': os.getenv('PNL_TRACE_LOG', ''),           # Optional JSON-lines file with one record per request
+    'trace_flush_interval': 1.0,                           # Seconds between background writes of queued trace records
+    'loop_lag_interval': 0.5                               # Seconds between event-loop lag probes
+}
@@ -0,0 +1,121 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+from PIL import ImageFont
+
+import config
+
+FONT_EXTENSIONS = ('.ttf', '.otf')
+
+
+def font_nbytes(path: str) -> int:
+    """Approximate memory of a loaded font, taken as its file size like the memory budget plans it"""
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+class FontRegistry:
+    """Process-wide cache of loaded fonts, one object per (path, size)
+
+    Capped at FONTS['max_bytes'] (set by the memory budget); the earliest loaded
+    fonts are dropped first, but the card fonts always stay.
+    """
+
+    def __init__(self):
+        self._fonts: 'OrderedDict[Tuple[str, int], ImageFont.FreeTypeFont]' = OrderedDict()
+        self._sizes: Dict[Tuple[str, int], int] = {}
+        self._bytes = 0
+        self._failed = set()
+        self._lock = threading.Lock()
+
+    def get(self, path: str, size: int):
+        """Return the font at path/size, falling back to the configured fallback or Pillow's default"""
+        key = (path, size)
+        font = self._fonts.get(key)
+        if font is not None:
+            return font
+
+        with self._lock:
+            font = self._fonts.get(key)
+            if font is None:
+                font = self._load(path, size)
+                self._fonts[key] = font
+                self._sizes[key] = font_nbytes(path)
+                self._bytes += self._sizes[key]
+                self._evict()
+        return font
+
+    @property
+    def current_bytes(self) -> int:
+        return self._bytes
+
+    def fits(self, path: str) -> bool:
+        """Whether one more face of this file stays within FONTS['max_bytes']"""
+        max_bytes = config.FONTS.get('max_bytes')
+        return max_bytes is None or self._bytes + font_nbytes(path) <= max_bytes
+
+    def resize(self, max_bytes: int):
+        """Change the byte cap (kept in FONTS['max_bytes'] so forked workers inherit it), dropping fonts to fit"""
+        with self._lock:
+            config.FONTS['max_bytes'] = max_bytes
+            self._evict()
+
+    def _evict(self):
+        # Caller holds the lock
+        max_bytes = config.FONTS.get('max_bytes')
+        if max_bytes is None or self._bytes <= max_bytes:
+            return
+        primary_font = config.FONTS['primary_font']
+        for key in [key for key in self._fonts if key[0] != primary_font]:
+            if self._bytes <= max_bytes:
+                break
+            del self._fonts[key]
+            self._bytes -= self._sizes.pop(key)
+
+    def _load(self, path: str, size: int):
+        candidates = [path, config.FONTS.get('fallback_font')]
+        for candidate in candidates:
+            if not candidate:
+                continue
+            try:
+                return ImageFont.truetype(candidate, size)
+            except OSError as e:
+                # Report each broken font file once instead of on every card
+                if candidate not in self._failed:
+                    self._failed.add(candidate)
+                    print(f"⚠️ Could not load font {candidate}: {e}")
+        return ImageFont.load_default()
+
+    def card_fonts(self) -> Dict[str, ImageFont.FreeTypeFont]:
+        """Fonts for every role in config.FONTS['sizes'], keyed by role"""
+        primary_font = config.FONTS['primary_font']
+        return {role: self.get(primary_font, size) for role, size in config.FONTS['sizes'].items()}
+
+    def preload(self) -> int:
+        """Load the card fonts and every shipped font file at the configured sizes, up to FONTS['max_bytes']"""
+        self.card_fonts()
+        sizes = set(config.FONTS['sizes'].values())
+        folder = config.FONTS['folder']
+        if config.FONTS.get('preload_folder', True) and os.path.isdir(folder):
+            for file in sorted(os.listdir(folder)):
+                if file.lower().endswith(FONT_EXTENSIONS):
+                    for size in sizes:
+                        if (f"{folder}/{file}", size) not in self._fonts and not self.fits(f"{folder}/{file}"):
+                            return len(self._fonts)  # Preloading more would only evict what is loaded
+                        self.get(f"{folder}/{file}", size)
+        return len(self._fonts)
+
+    def __len__(self):
+        return len(self._fonts)
+
+
+font_registry = FontRegistry()
+
+
+def preload_fonts():
+    """Pool initializer: warm the registry inside a worker process"""
+    font_registry.preload()
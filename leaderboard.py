@@ -0,0 +1,107 @@
+import time
+from bisect import bisect_left, insort
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+import config
+from ledger import Trade, TradeLedger
+
+
+class Ranking:
+    """Realized PnL per member, kept sorted as trades are added or expire"""
+
+    def __init__(self):
+        self.totals: Dict[int, Tuple[float, float, int]] = {}   # user_id -> (pnl, pnl_usd, trades)
+        self._order: List[Tuple[float, int]] = []               # (-pnl, user_id), best first
+
+    def apply(self, user_id: int, pnl: float, pnl_usd: float, trades: int):
+        """Add (or with negative values, remove) a member's trades"""
+        current = self.totals.get(user_id)
+        if current is not None:
+            del self._order[bisect_left(self._order, (-current[0], user_id))]
+            pnl, pnl_usd, trades = current[0] + pnl, current[1] + pnl_usd, current[2] + trades
+        if trades > 0:
+            self.totals[user_id] = (pnl, pnl_usd, trades)
+            insort(self._order, (-pnl, user_id))
+        else:
+            self.totals.pop(user_id, None)
+
+    def top(self, limit: int) -> List[Tuple[int, float, float, int]]:
+        """(user_id, pnl, pnl_usd, trades) for the best `limit` members"""
+        return [(user_id, *self.totals[user_id]) for _, user_id in self._order[:limit]]
+
+    def __len__(self):
+        return len(self.totals)
+
+
+class Leaderboard:
+    """Per-guild rankings for every configured window, updated incrementally
+
+    The all-time ranking only ever grows. Windowed rankings also keep their
+    trades in arrival order and subtract them again once they fall out of the
+    window, so reading a ranking never scans history.
+    """
+
+    def __init__(self, windows: Dict[str, Optional[float]] = None):
+        self.windows = windows or config.LEADERBOARD['windows']
+        self._rankings: Dict[Tuple[str, int], Ranking] = {}
+        self._recent: Dict[str, Deque[tuple]] = {name: deque() for name, seconds in self.windows.items() if seconds}
+        self.names: Dict[Tuple[int, int], str] = {}
+
+    def ranking(self, window: str, guild_id: int) -> Ranking:
+        key = (window, guild_id)
+        ranking = self._rankings.get(key)
+        if ranking is None:
+            ranking = self._rankings[key] = Ranking()
+        return ranking
+
+    def add(self, trade: Trade):
+        """Count a new trade in every window"""
+        ts, guild_id, user_id = trade.ts or time.time(), trade.guild_id, trade.user_id
+        pnl, pnl_usd = trade.pnl, trade.pnl * trade.sol_price
+        self.names[(guild_id, user_id)] = trade.username
+        for window, seconds in self.windows.items():
+            self.ranking(window, guild_id).apply(user_id, pnl, pnl_usd, 1)
+            if seconds:
+                self._recent[window].append((ts, guild_id, user_id, pnl, pnl_usd))
+
+    def expire(self, now: float = None):
+        """Drop trades that have aged out of each window"""
+        now = time.time() if now is None else now
+        for window, recent in self._recent.items():
+            cutoff = now - self.windows[window]
+            while recent and recent[0][0] < cutoff:
+                _, guild_id, user_id, pnl, pnl_usd = recent.popleft()
+                self.ranking(window, guild_id).apply(user_id, -pnl, -pnl_usd, -1)
+
+    def top(self, guild_id: int, window: str, limit: int = None) -> List[tuple]:
+        """(name, pnl_sol, pnl_usd, trades) for the leaders of one guild and window"""
+        self.expire()
+        limit = limit or config.LEADERBOARD['size']
+        return [(self.names.get((guild_id, user_id), str(user_id)), pnl, pnl_usd, trades)
+                for user_id, pnl, pnl_usd, trades in self.ranking(window, guild_id).top(limit)]
+
+    def title(self, window: str) -> str:
+        seconds = self.windows[window]
+        return f"TOP TRADERS // {'LAST ' + window.upper() if seconds else 'ALL TIME'}"
+
+    def load(self, ledger: TradeLedger):
+        """Seed every ranking from the ledger; blocking, call from a thread at startup"""
+        now = time.time()
+        for guild_id, user_id, username in ledger.latest_usernames():
+            self.names[(guild_id, user_id)] = username
+
+        windowed = {name: seconds for name, seconds in self.windows.items() if seconds}
+        for window, seconds in self.windows.items():
+            if not seconds:
+                # All-time comes straight from the running totals
+                for guild_id, user_id, pnl, pnl_usd, trades in ledger.all_user_totals():
+                    self.ranking(window, guild_id).apply(user_id, pnl, pnl_usd, trades)
+
+        if windowed:
+            oldest = now - max(windowed.values())
+            for ts, guild_id, user_id, username, pnl, pnl_usd in ledger.trades_since(oldest):
+                for window, seconds in windowed.items():
+                    if ts >= now - seconds:
+                        self.ranking(window, guild_id).apply(user_id, pnl, pnl_usd, 1)
+                        self._recent[window].append((ts, guild_id, user_id, pnl, pnl_usd))
@@ -0,0 +1,292 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trades (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    guild_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    username TEXT NOT NULL,
+    coin TEXT NOT NULL,
+    bought REAL NOT NULL,
+    sold REAL NOT NULL,
+    sol_price REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS trades_ts ON trades (ts);
+CREATE TABLE IF NOT EXISTS user_totals (
+    guild_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    trades INTEGER NOT NULL,
+    bought REAL NOT NULL,
+    sold REAL NOT NULL,
+    pnl REAL NOT NULL,
+    pnl_usd REAL NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (guild_id, user_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS coin_totals (
+    guild_id INTEGER NOT NULL,
+    coin TEXT NOT NULL,
+    trades INTEGER NOT NULL,
+    bought REAL NOT NULL,
+    sold REAL NOT NULL,
+    pnl REAL NOT NULL,
+    pnl_usd REAL NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (guild_id, coin)
+) WITHOUT ROWID;
+"""
+
+# Adds a batch's deltas onto the running totals in one statement per key
+UPSERT = """
+INSERT INTO {table} ({key}, trades, bought, sold, pnl, pnl_usd, updated) VALUES ({params}, ?, ?, ?, ?, ?, ?)
+ON CONFLICT ({key}) DO UPDATE SET
+    trades = trades + excluded.trades,
+    bought = bought + excluded.bought,
+    sold = sold + excluded.sold,
+    pnl = pnl + excluded.pnl,
+    pnl_usd = pnl_usd + excluded.pnl_usd,
+    updated = excluded.updated
+"""
+UPSERT_USER = UPSERT.format(table='user_totals', key='guild_id, user_id', params='?, ?')
+UPSERT_COIN = UPSERT.format(table='coin_totals', key='guild_id, coin', params='?, ?')
+
+
+@dataclass
+class Trade:
+    """One submitted /pnl trade"""
+    guild_id: int
+    user_id: int
+    username: str
+    coin: str
+    bought: float
+    sold: float
+    sol_price: float
+    ts: float = 0.0
+
+    @property
+    def pnl(self) -> float:
+        return self.sold - self.bought
+
+
+@dataclass
+class Totals:
+    """Running aggregate for a user or a coin"""
+    trades: int = 0
+    bought: float = 0.0
+    sold: float = 0.0
+    pnl: float = 0.0
+    pnl_usd: float = 0.0
+
+    def add(self, trade: Trade):
+        self.trades += 1
+        self.bought += trade.bought
+        self.sold += trade.sold
+        self.pnl += trade.pnl
+        self.pnl_usd += trade.pnl * trade.sol_price
+
+
+class TradeLedger:
+    """SQLite (WAL) store of every trade with incrementally maintained per-user and per-coin totals
+
+    record() only appends to an in-memory batch; batches are written in one
+    transaction on a worker thread, so the event loop never waits on disk.
+    A failed write keeps its trades queued and is retried with backoff.
+    """
+
+    def __init__(self, path: str = None, batch_size: int = None, flush_interval: float = None):
+        settings = config.LEDGER
+        self.path = path or settings['path']
+        self.batch_size = batch_size or settings['batch_size']
+        self.flush_interval = flush_interval or settings['flush_interval']
+        self.max_retry_delay = settings['max_retry_delay']
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._pending: List[Trade] = []
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.dropped = 0
+
+    def open(self):
+        """Open (creating if needed) the database; blocking, call from a thread at startup"""
+        if self._db is not None:
+            return
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')  # Durable across app crashes; WAL keeps it consistent
+        db.executescript(SCHEMA)
+        self._db = db
+
+    async def start(self):
+        """Open the database and start the background writer"""
+        await asyncio.to_thread(self.open)
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._writer())
+
+    async def close(self):
+        """Write anything still pending and close the database"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        finally:
+            if self._db is not None:
+                with self._db_lock:
+                    self._db.close()
+                self._db = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def record(self, trade: Trade):
+        """Queue a trade for the next batch write; never blocks"""
+        if not trade.ts:
+            trade.ts = time.time()
+        self._pending.append(trade)
+        if len(self._pending) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        """Write every queued trade now; returns how many were written
+
+        Raises sqlite3.OperationalError when the database itself fails (locked,
+        full, I/O); the unwritten trades then stay queued, ahead of newer ones.
+        """
+        if not self._pending:
+            return 0
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            written = self.written
+            try:
+                await asyncio.to_thread(self.write_batch, batch)
+            except sqlite3.OperationalError:
+                self._pending[:0] = batch
+                raise
+            except sqlite3.Error as e:
+                # One bad row fails the whole transaction: write row by row so only it is dropped
+                print(f"⚠️ Ledger batch of {len(batch)} trade(s) failed ({e}), writing them one at a time")
+                for index, trade in enumerate(batch):
+                    try:
+                        await asyncio.to_thread(self.write_batch, [trade])
+                    except sqlite3.OperationalError:
+                        self._pending[:0] = batch[index:]
+                        raise
+                    except sqlite3.Error as e:
+                        self.dropped += 1
+                        print(f"❌ Dropping a trade the ledger rejects ({trade.username}, {trade.coin}): {e}")
+            return self.written - written
+
+    async def _writer(self):
+        delay = None  # Set while writes are failing
+        while True:
+            if delay is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await asyncio.sleep(delay)  # Full batches don't cut a backoff short
+            self._wakeup.clear()
+            try:
+                await self.flush()
+                if delay is not None:
+                    print(f"✅ Ledger writes recovered, {self.pending} trade(s) still queued")
+                delay = None
+            except sqlite3.Error as e:
+                delay = min(delay * 2, self.max_retry_delay) if delay else self.flush_interval
+                print(f"❌ Failed to write {self.pending} trade(s) to the ledger, retrying in {delay:g}s: {e}")
+
+    def write_batch(self, batch: List[Trade]):
+        """Insert trades and fold them into the totals in a single transaction"""
+        users: Dict[Tuple[int, int], Totals] = defaultdict(Totals)
+        coins: Dict[Tuple[int, str], Totals] = defaultdict(Totals)
+        for trade in batch:
+            users[(trade.guild_id, trade.user_id)].add(trade)
+            coins[(trade.guild_id, trade.coin)].add(trade)
+        now = time.time()
+
+        with self._db_lock:
+            db = self._db
+            db.execute('BEGIN')
+            try:
+                db.executemany(
+                    'INSERT INTO trades (ts, guild_id, user_id, username, coin, bought, sold, sol_price) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    [(t.ts, t.guild_id, t.user_id, t.username, t.coin, t.bought, t.sold, t.sol_price) for t in batch]
+                )
+                # One upsert per distinct user/coin in the batch, not per trade
+                db.executemany(UPSERT_USER, [(*key, t.trades, t.bought, t.sold, t.pnl, t.pnl_usd, now) for key, t in users.items()])
+                db.executemany(UPSERT_COIN, [(*key, t.trades, t.bought, t.sold, t.pnl, t.pnl_usd, now) for key, t in coins.items()])
+                db.execute('COMMIT')
+            except Exception:
+                db.execute('ROLLBACK')
+                raise
+        self.written += len(batch)
+
+    def _totals(self, sql: str, params: tuple) -> Optional[Totals]:
+        with self._db_lock:
+            row = self._db.execute(sql, params).fetchone()
+        return Totals(*row) if row else None
+
+    def user_totals(self, guild_id: int, user_id: int) -> Optional[Totals]:
+        """Aggregate for one user in one guild: a primary-key lookup, no scan"""
+        return self._totals('SELECT trades, bought, sold, pnl, pnl_usd FROM user_totals WHERE guild_id = ? AND user_id = ?',
+                            (guild_id, user_id))
+
+    def coin_totals(self, guild_id: int, coin: str) -> Optional[Totals]:
+        """Aggregate for one coin in one guild: a primary-key lookup, no scan"""
+        return self._totals('SELECT trades, bought, sold, pnl, pnl_usd FROM coin_totals WHERE guild_id = ? AND coin = ?',
+                            (guild_id, coin.upper()))
+
+    async def summary(self, guild_id: int, user_id: int) -> Optional[Totals]:
+        """user_totals() including trades still waiting to be written"""
+        try:
+            await self.flush()
+        except sqlite3.Error:
+            pass  # The writer keeps retrying; show what is already stored
+        return await asyncio.to_thread(self.user_totals, guild_id, user_id)
+
+    def all_user_totals(self) -> List[tuple]:
+        """(guild_id, user_id, pnl, pnl_usd, trades) for every user, from the aggregates"""
+        with self._db_lock:
+            return self._db.execute('SELECT guild_id, user_id, pnl, pnl_usd, trades FROM user_totals').fetchall()
+
+    def trades_since(self, ts: float) -> List[tuple]:
+        """(ts, guild_id, user_id, username, pnl, pnl_usd) for trades at or after ts, oldest first"""
+        with self._db_lock:
+            return self._db.execute(
+                'SELECT ts, guild_id, user_id, username, sold - bought, (sold - bought) * sol_price FROM trades WHERE ts >= ? ORDER BY ts',
+                (ts,)
+            ).fetchall()
+
+    def latest_usernames(self) -> List[tuple]:
+        """(guild_id, user_id, username) with the name each user last traded under"""
+        with self._db_lock:
+            return self._db.execute(
+                'SELECT guild_id, user_id, username FROM trades WHERE id IN (SELECT MAX(id) FROM trades GROUP BY guild_id, user_id)'
+            ).fetchall()
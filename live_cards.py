@@ -0,0 +1,138 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import config
+from card import EncodedCard, PNLCard, render_card_prices
+from price_service import PriceService, PriceUnavailable
+from render_executor import RenderExecutor, RenderQueueFull
+
+
+class RateLimiter:
+    """Token bucket: at most `rate` acquisitions per second, with bursts up to `burst`"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+@dataclass
+class LiveCard:
+    """A posted card that is re-rendered as its asset's price moves"""
+    card: PNLCard                      # The card's inputs; only the price changes between edits
+    edit: Callable[[float, EncodedCard], Awaitable]
+    user_id: int
+    coin_id: str
+    encoder: Optional[str]
+    expires_at: float
+    price: float                       # Price currently shown
+
+    def render_args(self, sol_price: float) -> tuple:
+        """render_card_prices() arguments for this card at sol_price"""
+        card = self.card
+        return (card.username, card.coin_name, card.bought_sol, card.sold_sol, sol_price, card.background_path, card.theme_name)
+
+
+class LiveCardManager:
+    """Keeps live cards updated from one price read per asset per tick
+
+    Every edit goes through a shared token bucket so the bot as a whole stays
+    under Discord's rate limits, however many cards are live. Re-renders run on
+    the bot's render executor, so they count against its queue limit like any card;
+    each one only redraws the USD lines over the card's base cached in the worker.
+    """
+
+    def __init__(self, price_service: PriceService, render_executor: RenderExecutor):
+        settings = config.LIVE_CARDS
+        self.price_service = price_service
+        self.render_executor = render_executor
+        self.tick_interval = settings['tick']
+        self.duration = settings['duration']
+        self.max_cards = settings['max_cards']
+        self.max_per_user = settings['max_per_user']
+        self.limiter = RateLimiter(settings['edits_per_second'], settings['edit_burst'])
+        self._cards: Dict[str, List[LiveCard]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.edits = 0
+
+    def __len__(self):
+        return sum(len(cards) for cards in self._cards.values())
+
+    def can_add(self, user_id: int) -> bool:
+        """Whether another live card fits under the global and per-user caps"""
+        user_cards = sum(1 for cards in self._cards.values() for live in cards if live.user_id == user_id)
+        return len(self) < self.max_cards and user_cards < self.max_per_user
+
+    async def add(self, card: PNLCard, edit: Callable[[float, EncodedCard], Awaitable], user_id: int,
+                  encoder: Optional[str] = None, coin_id: str = 'solana') -> bool:
+        """Start updating a posted card; False if a cap is reached"""
+        if not self.can_add(user_id):
+            return False
+        live = LiveCard(card, edit, user_id, coin_id, encoder, time.monotonic() + self.duration, card.sol_price)
+        self._cards.setdefault(coin_id, []).append(live)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return True
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._cards.clear()
+
+    async def _run(self):
+        while self._cards:
+            await asyncio.sleep(self.tick_interval)
+            try:
+                await self.tick()
+            except Exception as e:
+                print(f"❌ Live card update failed: {e}")
+
+    async def tick(self):
+        """Read each live asset's price once and update every card showing a different one"""
+        now = time.monotonic()
+        for coin_id in list(self._cards):
+            cards = [live for live in self._cards[coin_id] if live.expires_at > now]
+            if not cards:
+                del self._cards[coin_id]
+                continue
+            self._cards[coin_id] = cards
+            try:
+                price = round(await self.price_service.get_price(coin_id), config.RESULT_CACHE['price_decimals'])
+            except PriceUnavailable:
+                continue
+
+            for live in [live for live in cards if live.price != price]:
+                try:
+                    encoded = await self.render_executor.run(render_card_prices, *live.render_args(price), encoder=live.encoder)
+                except RenderQueueFull:
+                    return  # Requests come first; the remaining cards catch up on a later tick
+                await self.limiter.acquire()
+                try:
+                    await live.edit(price, encoded)
+                except Exception as e:
+                    # Message deleted or interaction token expired: stop updating it
+                    print(f"⚠️ Dropping live card: {e}")
+                    cards.remove(live)
+                    continue
+                live.price = price
+                self.edits += 1
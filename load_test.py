@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Render server load test
+Drives GET /card on localhost with keep-alive connections and reports cards/sec and tail latency
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import Counter
+
+import aiohttp
+
+# Add the current directory to Python path so we can import our modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import config
+from benchmark_render import summarize
+
+
+def card_params(number: int, args) -> dict:
+    """Query for one of args.unique distinct cards, priced explicitly so runs are repeatable"""
+    params = {
+        'username': f'Trader{number}',
+        'coin': 'SOL',
+        'bought': '10',
+        'sold': f'{12 + number * 0.25:.2f}',
+        'sol_price': '150.00'
+    }
+    if args.format:
+        params['format'] = args.format
+    return params
+
+
+async def wait_for_server(session: aiohttp.ClientSession, url: str, timeout: float):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            async with session.get(f'{url}/healthz') as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"Render server at {url} did not come up within {timeout:.0f}s")
+        await asyncio.sleep(0.2)
+
+
+async def run(args) -> int:
+    connections = Counter()
+
+    async def on_connection(session, context, params):
+        connections['opened'] += 1
+
+    tracing = aiohttp.TraceConfig()
+    tracing.on_connection_create_end.append(on_connection)
+    # One connection per concurrent client, reused for every request it sends
+    connector = aiohttp.TCPConnector(limit=args.concurrency, keepalive_timeout=config.RENDER_SERVER['keepalive_timeout'])
+    async with aiohttp.ClientSession(connector=connector, trace_configs=[tracing]) as session:
+        await wait_for_server(session, args.url, args.startup_timeout)
+        connections.clear()
+
+        rng = random.Random(42)
+        etags = {}
+        latencies, statuses, cache = [], Counter(), Counter()
+        received = 0
+        remaining = args.requests
+
+        async def client():
+            nonlocal remaining, received
+            while remaining > 0:
+                remaining -= 1
+                number = rng.randrange(args.unique)
+                headers = {}
+                if number in etags and rng.random() < args.revalidate:
+                    headers['If-None-Match'] = etags[number]
+                started = time.perf_counter()
+                async with session.get(f'{args.url}/card', params=card_params(number, args), headers=headers) as response:
+                    async for chunk in response.content.iter_chunked(64 * 1024):
+                        received += len(chunk)
+                    latencies.append(time.perf_counter() - started)
+                    statuses[response.status] += 1
+                    if response.status == 200:
+                        etags[number] = response.headers['ETag']
+                        cache[response.headers.get('X-Cache', 'none')] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    stats = summarize(latencies)
+    print(f"🚀 {len(latencies):,} requests in {elapsed:.2f}s with {args.concurrency} client(s) over {connections['opened']} connection(s)")
+    print(f"📊 {statuses[200] / elapsed:,.1f} cards/s, {len(latencies) / elapsed:,.1f} requests/s, {received / elapsed / 1024 / 1024:.1f} MB/s")
+    print(f"{'latency':<10} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    print(f"{'':<10} {stats['mean_ms']:>9.2f} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f}")
+    print(f"🧾 Status: {dict(sorted(statuses.items()))}, cache: {dict(cache)}")
+    return 0 if set(statuses) <= {200, 304} else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the local render server")
+    parser.add_argument('--url', default=f"http://127.0.0.1:{config.RENDER_SERVER['port']}")
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--unique', type=int, default=200, help="Distinct cards requested")
+    parser.add_argument('--revalidate', type=float, default=0.0, help="Share of repeat requests sent with If-None-Match")
+    parser.add_argument('--format', choices=('png', 'webp', 'webp_lossless', 'jpeg'))
+    parser.add_argument('--spawn', action='store_true', help="Start render_server.py for the duration of the test")
+    parser.add_argument('--executor', choices=('process', 'thread'), help="Executor for the spawned server")
+    parser.add_argument('--startup-timeout', type=float, default=30.0)
+    args = parser.parse_args()
+
+    server = None
+    if args.spawn:
+        command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'render_server.py'),
+                   '--port', args.url.rsplit(':', 1)[1]]
+        if args.executor:
+            command += ['--executor', args.executor]
+        server = subprocess.Popen(command)
+    try:
+        sys.exit(asyncio.run(run(args)))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import os
+import resource
+from dataclasses import dataclass
+from typing import Callable, Iterable
+
+import config
+from backgrounds import background_cache
+from card import render_card, template_cache
+from fonts import font_registry
+
+MB = 1024 * 1024
+
+
+def _status_kb(field: str, pid='self') -> int:
+    """One kB field of /proc/<pid>/status, or 0 where /proc is unavailable"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return 0
+
+
+def rss_bytes(pid='self') -> int:
+    """Current resident set size of a process"""
+    kb = _status_kb('VmRSS', pid)
+    if kb == 0 and pid == 'self':
+        kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return kb * 1024
+
+
+def peak_rss_bytes(pid='self') -> int:
+    """High-water resident set size of a process since it started or the last reset"""
+    kb = _status_kb('VmHWM', pid)
+    if kb == 0 and pid == 'self':
+        kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return kb * 1024
+
+
+def reset_peak_rss() -> bool:
+    """Reset the kernel's peak RSS counter (Linux 4.0+); False if not possible"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def child_pids() -> Iterable[int]:
+    """Pids of this process's direct children, e.g. render pool workers"""
+    parent = str(os.getpid())
+    for entry in os.listdir('/proc') if os.path.isdir('/proc') else []:
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    # The command name may contain spaces, so split after its closing paren
+                    if f.read().rsplit(')', 1)[1].split()[1] == parent:
+                        yield int(entry)
+            except (OSError, IndexError):
+                continue
+
+
+def tree_peak_rss_bytes() -> int:
+    """Peak RSS of this process plus each child's peak: an upper bound on the combined peak"""
+    return peak_rss_bytes() + sum(peak_rss_bytes(pid) for pid in child_pids())
+
+
+def measure_render_peak(render: Callable[[], object]) -> int:
+    """Extra RSS one warm call of render needs at its peak, measured in this process"""
+    render()  # Fill the font, background and template caches first; those are budgeted separately
+    reset = reset_peak_rss()
+    before = rss_bytes()
+    render()
+    after = peak_rss_bytes() if reset else rss_bytes()
+    # Never trust less than a template copy plus an encode buffer of the same size
+    floor = config.DEFAULT_CARD_WIDTH * config.DEFAULT_CARD_HEIGHT * 3 * 2
+    return max(after - before, floor)
+
+
+@dataclass
+class BudgetPlan:
+    """How a memory budget is split between caches and concurrent renders"""
+    total_bytes: int
+    baseline_bytes: int
+    per_render_bytes: int
+    executor: str
+    workers: int
+    background_cache_bytes: int
+    template_cache_bytes: int
+    result_cache_bytes: int
+    font_cache_bytes: int
+    preload_font_folder: bool
+
+    def describe(self) -> str:
+        return (f"{self.total_bytes // MB}MB budget: {self.workers} {self.executor} worker(s) at "
+                f"~{self.per_render_bytes / MB:.1f}MB/render, caches "
+                f"{self.background_cache_bytes // MB}/{self.template_cache_bytes // MB}/{self.result_cache_bytes // MB}/{self.font_cache_bytes / MB:.1f}MB "
+                f"(background/template/result/font), baseline {self.baseline_bytes // MB}MB")
+
+
+def plan_budget(total_bytes: int, baseline_bytes: int, per_render_bytes: int,
+                font_folder_bytes: int = 0, cpus: int = None) -> BudgetPlan:
+    """Pick an executor, worker count and cache sizes that fit within total_bytes"""
+    settings = config.MEMORY_BUDGET
+    cpus = cpus or os.cpu_count() or 1
+    per_render = int(per_render_bytes * settings['render_headroom'])
+    available = max(0, total_bytes - baseline_bytes - settings['reserve_mb'] * MB)
+
+    cache_bytes = int(available * settings['cache_share'])
+    font_bytes = int(cache_bytes * 0.1)
+    image_bytes = int((cache_bytes - font_bytes) * 0.75)
+    result_bytes = cache_bytes - font_bytes - image_bytes
+    render_bytes = available - cache_bytes
+    wanted_workers = config.RENDER_EXECUTOR['workers'] or cpus
+
+    # Threads share one copy of every cache, so only the renders themselves multiply
+    thread_workers = max(1, min(wanted_workers, render_bytes // per_render if per_render else 1))
+
+    # Each worker process is a full interpreter with its own image caches; the
+    # main process keeps its copy too, so image caches are split (workers + 1) ways
+    process_workers = 0
+    per_process = settings['process_overhead_mb'] * MB + per_render
+    if cpus > 1:
+        process_workers = min(wanted_workers, cpus, render_bytes // per_process)
+
+    if process_workers >= 2:
+        executor, workers = 'process', int(process_workers)
+        image_share, font_share = image_bytes // (workers + 1), font_bytes // (workers + 1)
+    else:
+        executor, workers, image_share, font_share = 'thread', int(thread_workers), image_bytes, font_bytes
+
+    return BudgetPlan(
+        total_bytes=total_bytes,
+        baseline_bytes=baseline_bytes,
+        per_render_bytes=per_render_bytes,
+        executor=executor,
+        workers=workers,
+        background_cache_bytes=image_share // 2,
+        template_cache_bytes=image_share - image_share // 2,
+        result_cache_bytes=result_bytes,
+        font_cache_bytes=font_share,
+        preload_font_folder=font_folder_bytes <= font_share
+    )
+
+
+def font_folder_bytes() -> int:
+    """Size of every font file that preload would open at each configured size"""
+    folder = config.FONTS['folder']
+    if not os.path.isdir(folder):
+        return 0
+    sizes = len(set(config.FONTS['sizes'].values()))
+    return sizes * sum(entry.stat().st_size for entry in os.scandir(folder) if entry.is_file())
+
+
+def plan_for_cards(total_bytes: int, background_path: str = None) -> BudgetPlan:
+    """Measure a card render in this process and plan the budget around it"""
+    baseline = rss_bytes()
+    per_render = measure_render_peak(lambda: render_card('MEASURE', 'SOL', 1.0, 2.0, 100.0, background_path))
+    return plan_budget(total_bytes, baseline, per_render, font_folder_bytes())
+
+
+def apply_budget(plan: BudgetPlan, render_executor, result_cache):
+    """Resize the shared caches and the render executor to fit a plan; call before the pool starts"""
+    background_cache.resize(plan.background_cache_bytes)
+    template_cache.resize(plan.template_cache_bytes)
+    result_cache.resize(plan.result_cache_bytes)
+    render_executor.configure(plan.executor, plan.workers)
+    font_registry.resize(plan.font_cache_bytes)
+    config.FONTS['preload_folder'] = plan.preload_font_folder
@@ -0,0 +1,304 @@
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from typing import Callable, Dict, List, Optional, Tuple
+
+import config
+
+NULL_CONTEXT = nullcontext()
+
+
+def _label_key(labels: dict) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: tuple, extra: dict = None) -> str:
+    pairs = list(key) + sorted((extra or {}).items())
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}'
+
+
+class Summary:
+    """Count, sum and quantiles over the most recent observations"""
+
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self, window: int = 1024):
+        self.count = 0
+        self.total = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, value: float):
+        self.count += 1
+        self.total += value
+        self.recent.append(value)
+
+    def quantile(self, q: float) -> float:
+        if not self.recent:
+            return 0.0
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Timer:
+    """Context manager that observes its elapsed time into a summary"""
+
+    __slots__ = ('metrics', 'name', 'labels', 'started', 'elapsed')
+
+    def __init__(self, metrics: 'Metrics', name: str, labels: dict):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+        self.elapsed = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.started
+        self.metrics.observe(self.name, self.elapsed, **self.labels)
+        return False
+
+
+class RequestTrace:
+    """Per-request phase timings, fed into the metrics and the optional trace log"""
+
+    def __init__(self, metrics: 'Metrics', command: str, **fields):
+        self.metrics = metrics
+        self.command = command
+        self.fields = fields
+        self.phases: Dict[str, float] = {}
+        self.started = time.perf_counter()
+
+    def phase(self, name: str):
+        """Time one phase of the request: with trace.phase('render'): ..."""
+        return _PhaseTimer(self, name)
+
+    def record(self, name: str, seconds: float):
+        """Record a phase measured elsewhere (e.g. encode time reported by a worker)"""
+        self.phases[name] = seconds
+        self.metrics.observe('pnl_phase_seconds', seconds, command=self.command, phase=name)
+
+    def finish(self, outcome: str = 'ok', **fields):
+        total = time.perf_counter() - self.started
+        self.metrics.observe('pnl_request_seconds', total, command=self.command)
+        self.metrics.inc('pnl_requests_total', command=self.command, outcome=outcome)
+        self.fields.update(fields)
+        self.metrics.write_trace({
+            'ts': time.time(),
+            'command': self.command,
+            'outcome': outcome,
+            'total_ms': round(total * 1000, 2),
+            'phases_ms': {name: round(seconds * 1000, 2) for name, seconds in self.phases.items()},
+            **self.fields
+        })
+
+
+class _PhaseTimer:
+    __slots__ = ('trace', 'name', 'started')
+
+    def __init__(self, trace: RequestTrace, name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.record(self.name, time.perf_counter() - self.started)
+        return False
+
+
+class _NullTrace:
+    """Stand-in used when metrics are disabled, every call is a no-op"""
+
+    def phase(self, name: str):
+        return NULL_CONTEXT
+
+    def record(self, name: str, seconds: float):
+        pass
+
+    def finish(self, outcome: str = 'ok', **fields):
+        pass
+
+
+NULL_TRACE = _NullTrace()
+
+
+class Metrics:
+    """In-process counters, gauges and summaries exposed in Prometheus text format"""
+
+    def __init__(self, enabled: bool = None, trace_log: str = None):
+        settings = config.METRICS
+        self.enabled = settings['enabled'] if enabled is None else enabled
+        self.trace_log = settings['trace_log'] if trace_log is None else trace_log
+        self._counters: Dict[str, Dict[tuple, float]] = {}
+        self._gauges: Dict[str, Dict[tuple, float]] = {}
+        self._summaries: Dict[str, Dict[tuple, Summary]] = {}
+        self._callbacks: Dict[str, Tuple[str, Callable[[], float]]] = {}   # name -> (type, fn)
+        self._help: Dict[str, str] = {}
+        self._trace_file = None
+        self._trace_lines: List[str] = []      # Records waiting for the background writer
+        self._trace_lock = threading.Lock()
+        self._trace_task: Optional[asyncio.Task] = None
+        self._runner = None
+        self._lag_task: Optional[asyncio.Task] = None
+
+    def describe(self, name: str, text: str):
+        self._help[name] = text
+
+    def inc(self, name: str, value: float = 1, **labels):
+        if not self.enabled:
+            return
+        series = self._counters.setdefault(name, {})
+        key = _label_key(labels)
+        series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        if not self.enabled:
+            return
+        self._gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def gauge_callback(self, name: str, fn: Callable[[], float]):
+        """Gauge computed only when scraped, so it costs nothing per request"""
+        self._callbacks[name] = ('gauge', fn)
+
+    def counter_callback(self, name: str, fn: Callable[[], float]):
+        """Like gauge_callback, for a running total that only goes up (name it *_total)"""
+        self._callbacks[name] = ('counter', fn)
+
+    def observe(self, name: str, value: float, **labels):
+        if not self.enabled:
+            return
+        series = self._summaries.setdefault(name, {})
+        key = _label_key(labels)
+        summary = series.get(key)
+        if summary is None:
+            summary = series[key] = Summary()
+        summary.observe(value)
+
+    def timer(self, name: str, **labels):
+        """with metrics.timer('name'): ... observes the block's duration"""
+        if not self.enabled:
+            return NULL_CONTEXT
+        return Timer(self, name, labels)
+
+    def start_trace(self, command: str, **fields):
+        if not self.enabled:
+            return NULL_TRACE
+        return RequestTrace(self, command, **fields)
+
+    def write_trace(self, record: dict):
+        """Queue a trace record; a background task appends the queued records off the event loop"""
+        if not self.trace_log:
+            return
+        self._trace_lines.append(json.dumps(record) + '\n')
+        if self._trace_task is None:
+            self._trace_task = asyncio.create_task(self._trace_writer(config.METRICS['trace_flush_interval']))
+
+    async def flush_traces(self):
+        """Append every queued trace record to the trace log on a thread"""
+        if not self._trace_lines:
+            return
+        lines, self._trace_lines = self._trace_lines, []
+        try:
+            await asyncio.to_thread(self._append_traces, lines)
+        except OSError as e:
+            print(f"⚠️ Could not write {len(lines)} trace record(s): {e}")
+
+    def _append_traces(self, lines: List[str]):
+        with self._trace_lock:
+            if self._trace_file is None:
+                self._trace_file = open(self.trace_log, 'a')
+            self._trace_file.write(''.join(lines))
+            self._trace_file.flush()
+
+    async def _trace_writer(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush_traces()
+
+    def render(self) -> str:
+        """Current values in the Prometheus text exposition format"""
+        lines = []
+
+        def header(name, kind):
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        for name, series in sorted(self._counters.items()):
+            header(name, 'counter')
+            for key, value in series.items():
+                lines.append(f"{name}{_format_labels(key)} {value}")
+        for name, series in sorted(self._gauges.items()):
+            header(name, 'gauge')
+            for key, value in series.items():
+                lines.append(f"{name}{_format_labels(key)} {value}")
+        for name, (kind, fn) in sorted(self._callbacks.items()):
+            try:
+                value = float(fn())
+            except Exception:
+                continue
+            header(name, kind)
+            lines.append(f"{name} {value}")
+        for name, series in sorted(self._summaries.items()):
+            header(name, 'summary')
+            for key, summary in series.items():
+                for q in Summary.QUANTILES:
+                    lines.append(f"{name}{_format_labels(key, {'quantile': q})} {summary.quantile(q)}")
+                lines.append(f"{name}_sum{_format_labels(key)} {summary.total}")
+                lines.append(f"{name}_count{_format_labels(key)} {summary.count}")
+        return '\n'.join(lines) + '\n'
+
+    async def start(self, host: str = None, port: int = None):
+        """Serve /metrics on a local port and start the event-loop lag probe"""
+        if not self.enabled:
+            return
+        from aiohttp import web
+
+        async def handle_metrics(request):
+            return web.Response(text=self.render(), content_type='text/plain', charset='utf-8')
+
+        app = web.Application()
+        app.router.add_get('/metrics', handle_metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host or config.METRICS['host'], port or config.METRICS['port'])
+        await site.start()
+        self._lag_task = asyncio.create_task(self._probe_loop_lag(config.METRICS['loop_lag_interval']))
+        print(f"📈 Metrics on http://{host or config.METRICS['host']}:{port or config.METRICS['port']}/metrics")
+
+    async def stop(self):
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            self._lag_task = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        if self._trace_task is not None:
+            self._trace_task.cancel()
+            self._trace_task = None
+        await self.flush_traces()
+        with self._trace_lock:
+            if self._trace_file is not None:
+                self._trace_file.close()
+                self._trace_file = None
+
+    async def _probe_loop_lag(self, interval: float):
+        # How late a sleep wakes up is how long something blocked the loop
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            lag = max(0.0, time.perf_counter() - started - interval)
+            self.set_gauge('pnl_event_loop_lag_seconds', lag)
+            self.observe('pnl_event_loop_lag_summary_seconds', lag)
+
+
+metrics = Metrics()
@@ -0,0 +1,313 @@
+import asyncio
+import json
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Set
+
+import aiohttp
+
+import config
+
+
+@dataclass
+class PriceQuote:
+    """A USD price for one asset and when it was fetched"""
+    coin_id: str
+    price: float
+    fetched_at: float
+    stale: bool = False
+
+    @property
+    def age(self) -> float:
+        """Seconds since the quote was fetched"""
+        return time.monotonic() - self.fetched_at
+
+
+class PriceUnavailable(Exception):
+    """Raised when no fresh or last-known-good price exists"""
+
+
+def load_coin_ids() -> Dict[str, str]:
+    """Symbol -> CoinGecko id table: the built-in list plus an optional JSON file"""
+    table = {symbol.upper(): coin_id for symbol, coin_id in config.COIN_IDS.items()}
+    path = config.COIN_IDS_FILE
+    if path and os.path.exists(path):
+        with open(path) as f:
+            table.update({symbol.upper(): coin_id for symbol, coin_id in json.load(f).items()})
+    return table
+
+
+class PriceService:
+    """Shared CoinGecko client: per-asset TTL cache, batched and single-flight fetches"""
+
+    def __init__(self, api_url: str = None, ttl: float = None, batch_window: float = None, max_stale: float = None):
+        self.api_url = api_url or config.PRICE_API_URL
+        self.ttl = config.PRICE_CACHE_TTL if ttl is None else ttl
+        self.max_stale = config.PRICE_PREFETCH['max_stale'] if max_stale is None else max_stale
+        self.batch_window = config.PRICE_BATCH_WINDOW if batch_window is None else batch_window
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._quotes: Dict[str, PriceQuote] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._pending: Set[str] = set()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._coin_ids: Optional[Dict[str, str]] = None
+        self.last_requested: Dict[str, float] = {}
+        self.shared = None                 # Optional SharedCacheClient when running as one of several shards
+        self.upstream_requests = 0
+        self.stale_served = 0
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        # Created lazily so the session binds to the running event loop
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession()
+        return self._session
+
+    async def close(self):
+        """Close the long-lived HTTP session and fail every fetch still waiting on it"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        self._pending.clear()
+        self._settle_failed(list(self._inflight), PriceUnavailable("Price service closed"))
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def resolve(self, symbol: str) -> Optional[str]:
+        """CoinGecko id for a ticker symbol like SOL or BONK, or None if unknown"""
+        if self._coin_ids is None:
+            self._coin_ids = load_coin_ids()
+        return self._coin_ids.get(symbol.upper())
+
+    def cached(self, coin_id: str) -> Optional[PriceQuote]:
+        """Return the last quote for coin_id without touching the network"""
+        return self._quotes.get(coin_id)
+
+    async def get_quote(self, coin_id: str = 'solana') -> PriceQuote:
+        """Return a quote from memory when possible, fetching at most once per TTL per coin
+
+        Stale-while-revalidate: a quote past its TTL but within max_stale is
+        returned immediately while a refresh runs in the background.
+        """
+        self.last_requested[coin_id] = time.monotonic()
+        quote = self._quotes.get(coin_id)
+        if quote is not None:
+            if quote.age < self.ttl:
+                return quote
+            if quote.age < self.max_stale:
+                self.stale_served += 1
+                self._schedule(coin_id)
+                return PriceQuote(coin_id, quote.price, quote.fetched_at, stale=True)
+        return await asyncio.shield(self._schedule(coin_id))
+
+    def _schedule(self, coin_id: str) -> asyncio.Future:
+        # Coalesce concurrent callers onto one in-flight fetch, and every coin
+        # requested during the batch window into one upstream request
+        future = self._inflight.get(coin_id)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            # Background revalidations may have nobody awaiting them
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            self._inflight[coin_id] = future
+            self._pending.add(coin_id)
+            if self._flush_task is None:
+                self._flush_task = asyncio.create_task(self._flush_after(self.batch_window))
+        return future
+
+    def _settle_failed(self, coin_ids: Iterable[str], error: Exception):
+        """Fail the in-flight fetches of coin_ids so nobody waits on them forever"""
+        for coin_id in coin_ids:
+            future = self._inflight.pop(coin_id, None)
+            if future is not None and not future.done():
+                future.set_exception(error)
+
+    async def revalidate(self, coin_ids: Iterable[str]) -> Dict[str, PriceQuote]:
+        """Refresh coin_ids through the shared batch, sharing fetches already in flight"""
+        coin_ids = list(coin_ids)
+        results = await asyncio.gather(*(self._schedule(coin_id) for coin_id in coin_ids), return_exceptions=True)
+        return {coin_id: result for coin_id, result in zip(coin_ids, results) if isinstance(result, PriceQuote)}
+
+    async def get_price(self, coin_id: str = 'solana') -> float:
+        """Return just the USD price for coin_id"""
+        return (await self.get_quote(coin_id)).price
+
+    async def _flush_after(self, delay: float):
+        await asyncio.sleep(delay)
+        coin_ids = sorted(self._pending)
+        self._pending.clear()
+        self._flush_task = None
+        error: Exception = PriceUnavailable("Price refresh was cancelled")
+        try:
+            await self.refresh(coin_ids)
+        except Exception as e:
+            print(f"❌ Price refresh for {', '.join(coin_ids)} failed: {e}")
+            error = PriceUnavailable(f"Price refresh failed: {e}")
+        finally:
+            # Whatever refresh() did not settle would leave later callers joining a dead future
+            self._settle_failed(coin_ids, error)
+
+    async def refresh(self, coin_ids: Iterable[str]) -> Dict[str, PriceQuote]:
+        """Fetch all coin_ids in one request and settle anyone waiting on them"""
+        coin_ids = list(coin_ids)
+        error: Exception = PriceUnavailable("not returned by CoinGecko")
+        # Quotes another shard fetched within the TTL are reused, so the
+        # upstream sees one request per TTL however many shards are running
+        shared = await self.shared.get_prices(coin_ids, self.ttl) if self.shared is not None else {}
+        missing = [coin_id for coin_id in coin_ids if coin_id not in shared]
+        prices = {}
+        if missing:
+            try:
+                prices = await self._fetch(missing)
+            except Exception as e:
+                error = e
+            if prices and self.shared is not None:
+                await self.shared.put_prices(prices)
+
+        now = time.monotonic()
+        results = {}
+        for coin_id in coin_ids:
+            if coin_id in shared:
+                price, age = shared[coin_id]
+                result = self._quotes[coin_id] = PriceQuote(coin_id, price, now - age)
+            elif coin_id in prices:
+                result = self._quotes[coin_id] = PriceQuote(coin_id, prices[coin_id], now)
+            else:
+                last = self._quotes.get(coin_id)
+                if last is None:
+                    result = PriceUnavailable(f"No price for {coin_id}: {error}")
+                else:
+                    print(f"⚠️ Price fetch for {coin_id} failed ({error}), serving quote from {last.age:.0f}s ago")
+                    result = PriceQuote(coin_id, last.price, last.fetched_at, stale=True)
+
+            future = self._inflight.pop(coin_id, None)
+            if future is not None and not future.done():
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+            if not isinstance(result, Exception):
+                results[coin_id] = result
+        return results
+
+    async def _fetch(self, coin_ids: list) -> Dict[str, float]:
+        """Fetch with per-attempt timeouts, exponential backoff and a total deadline"""
+        settings = config.PRICE_FETCH
+        deadline = time.monotonic() + settings['deadline']
+        delay = settings['backoff']
+        last_error: Exception = PriceUnavailable(f"No attempts made for {', '.join(coin_ids)}")
+
+        for attempt in range(settings['attempts']):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                timeout = min(settings['attempt_timeout'], remaining)
+                return await asyncio.wait_for(self._fetch_once(coin_ids), timeout)
+            except asyncio.TimeoutError:
+                last_error = PriceUnavailable(f"Attempt {attempt + 1} timed out")
+            except (aiohttp.ClientError, PriceUnavailable, KeyError, ValueError) as e:
+                last_error = e
+
+            # Back off before retrying, but never past the deadline
+            sleep_for = min(delay, deadline - time.monotonic())
+            if attempt + 1 < settings['attempts'] and sleep_for > 0:
+                await asyncio.sleep(sleep_for)
+            delay *= 2
+
+        raise last_error
+
+    async def _fetch_once(self, coin_ids: list) -> Dict[str, float]:
+        session = await self._get_session()
+        params = {'ids': ','.join(coin_ids), 'vs_currencies': 'usd'}
+        self.upstream_requests += 1
+        async with session.get(self.api_url, params=params) as response:
+            if response.status != 200:
+                raise PriceUnavailable(f"CoinGecko returned HTTP {response.status}")
+            data = await response.json()
+            return {coin_id: float(data[coin_id]['usd']) for coin_id in coin_ids if 'usd' in data.get(coin_id, {})}
+
+
+class PricePrefetcher:
+    """Background task that keeps recently requested quotes warm
+
+    Each asset is refreshed on an interval that grows with the time since it
+    was last requested, so busy coins stay fresh and idle ones cost little.
+    A coin whose refresh fails waits failure_backoff, then twice as long after
+    each further failure (up to max_interval), so an outage or rate limit is
+    not hit with a full retry sequence every tick.
+    """
+
+    def __init__(self, service: PriceService, pinned: Iterable[str] = ('solana',)):
+        settings = config.PRICE_PREFETCH
+        self.service = service
+        self.pinned = tuple(pinned)
+        self.tick = settings['tick']
+        self.min_interval = settings['min_interval']
+        self.max_interval = settings['max_interval']
+        self.hot_window = settings['hot_window']
+        self.forget_after = settings['forget_after']
+        self.failure_backoff = settings['failure_backoff']
+        self.failures: Dict[str, int] = {}
+        self.next_attempt: Dict[str, float] = {}   # coin_id -> monotonic time before which it is not retried
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start the refresh loop; safe to call again on reconnect"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def interval_for(self, coin_id: str, now: float) -> float:
+        """Seconds between refreshes: min_interval while hot, growing linearly once idle"""
+        if coin_id in self.pinned:
+            return self.min_interval
+        idle = now - self.service.last_requested.get(coin_id, now)
+        if idle <= self.hot_window:
+            return self.min_interval
+        return min(self.max_interval, self.min_interval * idle / self.hot_window)
+
+    def due(self, now: float = None) -> list:
+        """Active coins whose quote is older than their refresh interval"""
+        now = time.monotonic() if now is None else now
+        for coin_id, requested in list(self.service.last_requested.items()):
+            if coin_id not in self.pinned and now - requested > self.forget_after:
+                del self.service.last_requested[coin_id]
+                self.failures.pop(coin_id, None)
+                self.next_attempt.pop(coin_id, None)
+
+        due = []
+        for coin_id in set(self.pinned) | set(self.service.last_requested):
+            if now < self.next_attempt.get(coin_id, 0.0):
+                continue
+            quote = self.service.cached(coin_id)
+            if quote is None or now - quote.fetched_at >= self.interval_for(coin_id, now):
+                due.append(coin_id)
+        return sorted(due)
+
+    def record_results(self, coin_ids: list, quotes: Dict[str, PriceQuote], now: float = None):
+        """Clear the backoff of refreshed coins and push back the next attempt for failed ones"""
+        now = time.monotonic() if now is None else now
+        for coin_id in coin_ids:
+            quote = quotes.get(coin_id)
+            if quote is not None and not quote.stale:
+                self.failures.pop(coin_id, None)
+                self.next_attempt.pop(coin_id, None)
+                continue
+            failures = self.failures[coin_id] = self.failures.get(coin_id, 0) + 1
+            self.next_attempt[coin_id] = now + min(self.max_interval, self.failure_backoff * 2 ** (failures - 1))
+
+    async def _run(self):
+        while True:
+            coin_ids = self.due()
+            if coin_ids:
+                self.record_results(coin_ids, await self.service.revalidate(coin_ids))
+            await asyncio.sleep(self.tick)
@@ -0,0 +1,163 @@
+import random
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from PIL import Image, ImageChops, ImageDraw, ImageFilter, ImageOps
+
+import config
+
+PREFIX = 'procedural:'      # Background paths starting with this select a generated variant
+NAME_PREFIX = 'procedural-'  # Background names offered to users, e.g. procedural-3
+VERSION = 1                  # Bump whenever the generator's output changes, so cached cards are re-rendered
+
+Color = Tuple[int, int, int]
+
+
+def procedural_path(seed: int) -> str:
+    """Background path that selects the generated variant with this seed"""
+    return f"{PREFIX}{seed}"
+
+
+def procedural_seed(background_path: Optional[str]) -> Optional[int]:
+    """Seed of a generated background path, or None for an image file"""
+    if background_path and background_path.startswith(PREFIX):
+        try:
+            return int(background_path[len(PREFIX):])
+        except ValueError:
+            return None
+    return None
+
+
+def variant_names() -> List[str]:
+    """Names of the generated backgrounds offered next to the image files"""
+    return [f"{NAME_PREFIX}{seed}" for seed in range(config.PROCEDURAL_BACKGROUNDS['variants'])]
+
+
+def variant_path(name: str) -> Optional[str]:
+    """procedural-3 -> 'procedural:3', or None if name is not a generated background"""
+    if name.startswith(NAME_PREFIX) and name[len(NAME_PREFIX):].isdigit():
+        return procedural_path(int(name[len(NAME_PREFIX):]))
+    return None
+
+
+@dataclass(frozen=True)
+class Style:
+    """Layer settings of one variant, all derived from its seed"""
+    gradient: Optional[str]   # 'vertical', 'horizontal', 'radial' or None for a flat base
+    grid_spacing: int
+    grid_offset: int
+    grid_strength: float      # How far grid lines blend from the base toward the grid color
+    noise: int                # Brightest grain added to any pixel
+    glows: int
+    glow_color: int           # Index into the theme's glow colors
+    scanlines: int            # Spacing between darkened rows, 0 for none
+    vignette: float           # How much the corners darken
+
+
+# Seed 0 is the original flat base with a 40px grid
+CLASSIC = Style(None, 40, 0, 1.0, 0, 0, 0, 0, 0.0)
+
+
+def style_for(seed: int) -> Style:
+    if seed == 0:
+        return CLASSIC
+    rng = random.Random(seed)
+    return Style(
+        gradient=rng.choice(('vertical', 'horizontal', 'radial')),
+        grid_spacing=rng.choice((24, 32, 40, 48, 64)),
+        grid_offset=rng.randrange(64),
+        grid_strength=rng.uniform(0.5, 1.0),
+        noise=rng.randrange(0, 14),
+        glows=rng.randrange(1, 5),
+        glow_color=rng.randrange(8),
+        scanlines=rng.choice((0, 0, 3, 4)),
+        vignette=rng.uniform(0.2, 0.6)
+    )
+
+
+def line_mask(size: Tuple[int, int], spacing: int, offset: int, value: int, columns: bool = True, rows: bool = True) -> Image.Image:
+    """'L' mask with value on every spacing-th column and/or row, 0 elsewhere
+
+    Built by repeating one bytes pattern over the whole image, so a full grid is a
+    few C-level copies rather than a draw call per line.
+    """
+    width, height = size
+    start = (spacing - offset % spacing) % spacing
+    if columns:
+        row = ((bytes([value]) + bytes(spacing - 1)) * (width // spacing + 2))[start:start + width]
+    else:
+        row = bytes(width)
+    line = bytes([value]) * width if rows else row
+    data = (line + row * (spacing - 1)) * (height // spacing + 2)
+    return Image.frombytes('L', size, data[start * width:(start + height) * width])
+
+
+def value_noise(size: Tuple[int, int], rng: random.Random, cell: int) -> Image.Image:
+    """Smooth 'L' noise: random bytes on a coarse lattice, upscaled bicubically"""
+    width, height = size
+    lattice = (max(2, width // cell), max(2, height // cell))
+    coarse = Image.frombytes('L', lattice, rng.randbytes(lattice[0] * lattice[1]))
+    return coarse.resize(size, Image.Resampling.BICUBIC)
+
+
+def mix(a: Color, b: Color, t: float) -> Color:
+    return tuple(round(x + (y - x) * t) for x, y in zip(a, b))
+
+
+def generate_background(width: int, height: int, theme_name: str = None, seed: int = 0) -> Image.Image:
+    """Build a background from the theme's palette; the same inputs give the same pixels"""
+    theme = config.THEMES.get(theme_name or config.DEFAULT_THEME, config.THEMES[config.DEFAULT_THEME])
+    style = style_for(seed)
+    rng = random.Random(f"{seed}:layers")
+    size = (width, height)
+    base = theme['background']
+
+    # Gradient: Pillow's 256px ramps, stretched and mapped through a two-color lookup table
+    if style.gradient is None:
+        img = Image.new('RGB', size, base)
+    else:
+        ramp = Image.radial_gradient('L') if style.gradient == 'radial' else Image.linear_gradient('L')
+        if style.gradient == 'horizontal':
+            ramp = ramp.transpose(Image.Transpose.ROTATE_90)
+        lit = mix(base, theme['accent'], 0.35)
+        dark = mix(base, (0, 0, 0), 0.55)
+        img = ImageOps.colorize(ramp.resize(size, Image.Resampling.BILINEAR), lit, dark)
+
+    # Grid: one mask for every line, composited over the base in a single pass
+    grid = line_mask(size, style.grid_spacing, style.grid_offset, round(255 * style.grid_strength))
+    img = Image.composite(Image.new('RGB', size, theme['grid']), img, grid)
+
+    # Grain: two octaves of value noise added to every channel
+    if style.noise:
+        noise = Image.blend(value_noise(size, rng, 64), value_noise(size, rng, 4), 0.5)
+        noise = noise.point(lambda v: v * style.noise // 255)
+        img = ImageChops.add(img, Image.merge('RGB', (noise, noise, noise)))
+
+    # Glow: a few soft blobs drawn and blurred at 1/8 scale, then screened over the image
+    if style.glows:
+        small = (max(1, width // 8), max(1, height // 8))
+        blobs = Image.new('L', small, 0)
+        draw = ImageDraw.Draw(blobs)
+        for _ in range(style.glows):
+            x, y = rng.uniform(0, small[0]), rng.uniform(0, small[1])
+            radius = rng.uniform(0.08, 0.25) * small[0]
+            draw.ellipse([x - radius, y - radius, x + radius, y + radius], fill=rng.randrange(60, 140))
+        blobs = blobs.filter(ImageFilter.GaussianBlur(small[0] / 16))
+        glow_colors = theme['glow']
+        glow = ImageOps.colorize(blobs.resize(size, Image.Resampling.BICUBIC), (0, 0, 0), glow_colors[style.glow_color % len(glow_colors)])
+        img = ImageChops.screen(img, glow)
+
+    # Scanlines and vignette: grayscale shades combined first, then one multiply over the image
+    shade = None
+    if style.scanlines:
+        shade = line_mask(size, style.scanlines, 0, 40, columns=False).point(lambda v: 255 - v)
+    if style.vignette:
+        vignette = Image.radial_gradient('L').resize(size, Image.Resampling.BILINEAR)
+        vignette = vignette.point(lambda v: 255 - round(v * style.vignette))
+        shade = vignette if shade is None else ImageChops.multiply(shade, vignette)
+    if shade is not None:
+        img = ImageChops.multiply(img, Image.merge('RGB', (shade, shade, shade)))
+
+    # Accent frame
+    ImageDraw.Draw(img).rectangle([10, 10, width - 10, height - 10], outline=theme['accent'], width=2)
+    return img
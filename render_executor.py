@@ -0,0 +1,186 @@
+import asyncio
+import mmap
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from typing import Optional
+
+import config
+from card import EncodedCard
+from fonts import preload_fonts
+
+SHARED_PREFIX = 'pnl-card-'
+
+
+class RenderQueueFull(Exception):
+    """Raised when more renders are pending than the executor accepts"""
+
+
+@dataclass
+class SharedCard:
+    """An encoded card a worker process left in a memory-backed file for the parent to map"""
+    path: str
+    size: int
+    encoder: str
+    extension: str
+    encode_seconds: float
+
+
+def shared_memory_folder() -> str:
+    """Memory-backed folder for handing cards back from workers, or '' to pickle them instead"""
+    folder = '/dev/shm'
+    if config.RENDER_EXECUTOR['shared_memory'] and os.path.isdir(folder) and os.access(folder, os.W_OK):
+        return folder
+    return ''
+
+
+def share_card(encoded: EncodedCard, folder: str) -> SharedCard:
+    """Worker side: write the encoded bytes to shared memory instead of pickling them"""
+    path = os.path.join(folder, f"{SHARED_PREFIX}{os.getppid()}-{uuid.uuid4().hex}")
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    try:
+        view = memoryview(encoded.data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+    return SharedCard(path, encoded.size, encoded.encoder, encoded.extension, encoded.encode_seconds)
+
+
+def attach_card(shared: SharedCard) -> EncodedCard:
+    """Parent side: map a worker's card read-only, without copying it, and remove its name"""
+    try:
+        with open(shared.path, 'rb') as f:
+            mapping = mmap.mmap(f.fileno(), shared.size, access=mmap.ACCESS_READ)
+    finally:
+        # The mapping stays valid until the last view of it is dropped
+        os.unlink(shared.path)
+    return EncodedCard(memoryview(mapping), shared.encoder, shared.extension, shared.encode_seconds)
+
+
+def release_card(future: Future):
+    """Done callback for a render nobody waits for anymore: delete its shared file"""
+    if not future.cancelled() and future.exception() is None and isinstance(future.result(), SharedCard):
+        try:
+            os.unlink(future.result().path)
+        except FileNotFoundError:
+            pass
+
+
+def sweep_shared_cards(folder: str):
+    """Delete shared cards left behind by bot processes that have exited"""
+    for entry in os.scandir(folder):
+        if entry.name.startswith(SHARED_PREFIX):
+            try:
+                os.kill(int(entry.name[len(SHARED_PREFIX):].split('-', 1)[0]), 0)
+            except ProcessLookupError:
+                os.unlink(entry.path)
+            except (ValueError, PermissionError, FileNotFoundError):
+                continue
+
+
+def render_shared(folder: str, min_bytes: int, fn, *args, **kwargs):
+    """Worker entry point: run fn and hand a large EncodedCard result back through shared memory"""
+    result = fn(*args, **kwargs)
+    if isinstance(result, EncodedCard) and result.size >= min_bytes:
+        return share_card(result, folder)
+    return result
+
+
+def warm_worker(barrier, fn, *args, **kwargs):
+    """Warm-up entry point: run fn, then hold this worker until every other one has run it too"""
+    result = fn(*args, **kwargs)
+    # A worker waiting here cannot take a second warm-up call, so each worker runs exactly one
+    barrier.wait()
+    return result
+
+
+class RenderExecutor:
+    """Runs card renders off the event loop on a process or thread pool"""
+
+    def __init__(self, kind: str = None, workers: int = None, max_pending: int = None):
+        settings = config.RENDER_EXECUTOR
+        self.kind = kind or settings['kind']
+        self.workers = workers or settings['workers'] or os.cpu_count() or 1
+        self.max_pending = max_pending or settings['max_pending']
+        if self.kind not in ('process', 'thread'):
+            raise ValueError(f"Unknown render executor kind: {self.kind}")
+        self.shared_folder = shared_memory_folder()
+        self._pool: Optional[Executor] = None
+        self._pending = 0
+
+    def configure(self, kind: str, workers: int):
+        """Switch pool kind and size; only allowed before the first render starts the pool"""
+        if self._pool is not None:
+            raise RuntimeError("Render pool already started")
+        if kind not in ('process', 'thread'):
+            raise ValueError(f"Unknown render executor kind: {kind}")
+        self.kind = kind
+        self.workers = workers
+
+    @property
+    def queue_depth(self) -> int:
+        """Renders submitted and not yet finished"""
+        return self._pending
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            if self.kind == 'process':
+                if self.shared_folder:
+                    sweep_shared_cards(self.shared_folder)
+                # Workers start with the shared fonts already parsed
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=preload_fonts)
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='render')
+        return self._pool
+
+    async def run(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) on the pool, rejecting work beyond max_pending"""
+        if self._pending >= self.max_pending:
+            raise RenderQueueFull(f"{self._pending} renders already pending")
+        self._pending += 1
+        try:
+            if self.kind == 'process' and self.shared_folder:
+                # Encoded cards come back through shared memory: no pickling, pipe or unpickling copies
+                call = partial(render_shared, self.shared_folder, config.RENDER_EXECUTOR['shared_memory_min_bytes'], fn, *args, **kwargs)
+            else:
+                call = partial(fn, *args, **kwargs)
+            future = self._get_pool().submit(call)
+            try:
+                result = await asyncio.wrap_future(future)
+            except asyncio.CancelledError:
+                future.add_done_callback(release_card)
+                raise
+            return attach_card(result) if isinstance(result, SharedCard) else result
+        finally:
+            self._pending -= 1
+
+    async def warm_up(self, fn, *args, **kwargs) -> list:
+        """Start every worker and run fn(*args, **kwargs) exactly once in each
+
+        Each call waits on a shared barrier once fn returns, so a fast worker cannot
+        take a second call while another stays cold. The calls count against
+        max_pending like any render.
+        """
+        pool = self._get_pool()
+        timeout = config.STARTUP['warm_timeout']
+        manager = multiprocessing.Manager() if self.kind == 'process' else None
+        barrier = manager.Barrier(self.workers, timeout=timeout) if manager else threading.Barrier(self.workers, timeout=timeout)
+        self._pending += self.workers
+        try:
+            futures = [pool.submit(warm_worker, barrier, fn, *args, **kwargs) for _ in range(self.workers)]
+            return await asyncio.gather(*(asyncio.wrap_future(future) for future in futures))
+        finally:
+            self._pending -= self.workers
+            if manager is not None:
+                manager.shutdown()
+
+    def shutdown(self, wait: bool = True):
+        """Stop the worker pool"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait, cancel_futures=True)
+            self._pool = None
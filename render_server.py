@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Local HTTP render service
+Serves PNL cards over HTTP with the same renderer, worker pool and caches as the bot
+"""
+
+import argparse
+import asyncio
+import math
+import os
+import signal
+import sys
+import time
+from typing import Dict, Optional
+
+from aiohttp import web
+
+# Add the current directory to Python path so we can import our modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import config
+from backgrounds import background_index
+from card import ENCODERS, EncodedCard, render_card, warm_card_assets
+from metrics import metrics
+from price_service import PriceService, PriceUnavailable
+from render_executor import RenderExecutor, RenderQueueFull
+from result_cache import CardResultCache, card_cache_key
+
+CONTENT_TYPES = {'png': 'image/png', 'webp': 'image/webp', 'jpg': 'image/jpeg'}
+
+
+class BadRequest(ValueError):
+    """A query parameter is missing or invalid"""
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Whether an If-None-Match header lists etag (weak comparison, as RFC 9110 asks) or is *"""
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*' or candidate.removeprefix('W/') == etag:
+            return True
+    return False
+
+
+class RenderServer:
+    """GET /card renders a PNL card; the ETag is the card's content key
+
+    Conditional requests are answered before any render, identical renders in
+    flight share one worker job, and the body is streamed in chunks.
+    """
+
+    def __init__(self, render_executor: RenderExecutor, result_cache: CardResultCache, price_service: PriceService):
+        self.render_executor = render_executor
+        self.result_cache = result_cache
+        self.price_service = price_service
+        self.settings = config.RENDER_SERVER
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._runner: Optional[web.AppRunner] = None
+        self.requests = 0
+        self.not_modified = 0
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/card', self.handle_card)
+        app.router.add_get('/healthz', self.handle_health)
+        return app
+
+    async def start(self, host: str = None, port: int = None):
+        """Listen on a local port; connections are kept alive between requests"""
+        host = host or self.settings['host']
+        port = port or self.settings['port']
+        self._runner = web.AppRunner(self.app(), access_log=None, keepalive_timeout=self.settings['keepalive_timeout'])
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port, backlog=self.settings['backlog']).start()
+        print(f"🌐 Render server on http://{host}:{port}/card")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        return web.json_response({'ok': True, 'queue_depth': self.render_executor.queue_depth, 'requests': self.requests})
+
+    async def handle_card(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        trace = metrics.start_trace('http_card')
+        try:
+            username, coin_name, bought, sold, sol_price, background_path, encoder = await self.parse(request.query)
+        except BadRequest as e:
+            trace.finish('invalid')
+            return web.json_response({'error': str(e)}, status=400)
+
+        # Explicitly priced cards never change; priced-now cards only until the next quote
+        max_age = self.settings['max_age'] if 'sol_price' in request.query else int(config.PRICE_CACHE_TTL)
+        key = card_cache_key(username, coin_name, bought, sold, sol_price, background_path, None, encoder)
+        etag = f'"{key}"'
+        headers = {'ETag': etag, 'Cache-Control': f'public, max-age={max_age}'}
+
+        # The key is known before rendering, so a revalidation costs no render at all
+        if etag_matches(request.headers.get('If-None-Match', ''), etag):
+            self.not_modified += 1
+            trace.finish('not_modified')
+            return web.Response(status=304, headers=headers)
+
+        try:
+            encoded, cache = await self.card(key, trace, username, coin_name, bought, sold, sol_price, background_path, encoder)
+        except RenderQueueFull:
+            trace.finish('busy')
+            return web.json_response({'error': 'render queue full'}, status=503, headers={'Retry-After': '1'})
+
+        headers['Content-Type'] = CONTENT_TYPES[encoded.extension]
+        headers['X-Cache'] = cache
+        response = web.StreamResponse(headers=headers)
+        response.content_length = encoded.size
+        await response.prepare(request)
+        with trace.phase('send'):
+            view = memoryview(encoded.data)
+            chunk = self.settings['chunk_bytes']
+            for start in range(0, len(view), chunk):
+                await response.write(view[start:start + chunk])
+        await response.write_eof()
+        trace.finish('ok', cache_hit=cache == 'hit', cache=cache, bytes=encoded.size)
+        return response
+
+    async def parse(self, query) -> tuple:
+        """Validated render inputs from the query string"""
+        username = query.get('username', '').strip()
+        coin_name = query.get('coin', '').strip()
+        if not username or not coin_name:
+            raise BadRequest("username and coin are required")
+        if len(username) > self.settings['max_text_length'] or len(coin_name) > self.settings['max_text_length']:
+            raise BadRequest(f"username and coin are limited to {self.settings['max_text_length']} characters")
+        try:
+            bought = float(query['bought'])
+            sold = float(query['sold'])
+            sol_price = float(query['sol_price']) if 'sol_price' in query else None
+        except KeyError as e:
+            raise BadRequest(f"{e.args[0]} is required")
+        except ValueError:
+            raise BadRequest("bought, sold and sol_price must be numbers")
+        if not all(math.isfinite(value) for value in (bought, sold, sol_price or 0.0)):
+            raise BadRequest("bought, sold and sol_price must be finite")
+
+        background = query.get('background')
+        background_path = background_index.get(background)
+        if background and background_path is None:
+            raise BadRequest(f"unknown background '{background}'")
+        encoder = query.get('format') or None
+        if encoder is not None and encoder not in ENCODERS:
+            raise BadRequest(f"format must be one of {', '.join(ENCODERS)}")
+
+        if sol_price is None:
+            try:
+                sol_price = await self.price_service.get_price('solana')
+            except PriceUnavailable:
+                sol_price = config.FALLBACK_SOL_PRICE
+        sol_price = round(sol_price, config.RESULT_CACHE['price_decimals'])
+        return username, coin_name, bought, sold, sol_price, background_path, encoder
+
+    async def card(self, key: str, trace, *args) -> tuple:
+        """(encoded card, 'hit', 'coalesced' or 'miss'), rendering at most once per key at a time"""
+        encoded = await self.result_cache.aget(key)
+        if encoded is not None:
+            return encoded, 'hit'
+        task = self._inflight.get(key)
+        if task is not None:
+            return await asyncio.shield(task), 'coalesced'
+
+        # The render is its own task and every waiter shields it, so a client that
+        # disconnects cancels only its own wait, never the render others share
+        task = self._inflight[key] = asyncio.create_task(self.render(key, trace, *args))
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())  # Don't warn when every waiter left
+        return await asyncio.shield(task), 'miss'
+
+    async def render(self, key: str, trace, username, coin_name, bought, sold, sol_price, background_path, encoder) -> EncodedCard:
+        """Render and cache one card for everyone waiting on key"""
+        try:
+            with trace.phase('render'):
+                encoded: EncodedCard = await self.render_executor.run(
+                    render_card, username, coin_name, bought, sold, sol_price, background_path, encoder=encoder)
+            trace.record('encode', encoded.encode_seconds)
+            await self.result_cache.aput(key, encoded)
+            return encoded
+        finally:
+            del self._inflight[key]
+
+
+async def serve(args):
+    """Run the render service on its own, without the Discord bot"""
+    started = time.perf_counter()
+    await asyncio.to_thread(background_index.refresh)
+    render_executor = RenderExecutor(args.executor, args.workers)
+    price_service = PriceService()
+    server = RenderServer(render_executor, CardResultCache(), price_service)
+    await render_executor.warm_up(warm_card_assets, background_index.get())
+    await server.start(args.host, args.port)
+    await metrics.start()
+    print(f"🔥 Ready in {time.perf_counter() - started:.2f}s with {render_executor.workers} {render_executor.kind} worker(s)")
+    # SIGTERM shuts down like Ctrl+C, so the worker processes are not orphaned
+    stopping = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stopping.set)
+    try:
+        await stopping.wait()
+    finally:
+        await server.stop()
+        await price_service.close()
+        await metrics.stop()
+        render_executor.shutdown(wait=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve PNL cards over HTTP")
+    parser.add_argument('--host', default=config.RENDER_SERVER['host'])
+    parser.add_argument('--port', type=int, default=config.RENDER_SERVER['port'])
+    parser.add_argument('--executor', choices=('process', 'thread'), default=None)
+    parser.add_argument('--workers', type=int, default=None)
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        print("\n🛑 Render server stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import config
+from procedural import VERSION as PROCEDURAL_VERSION, procedural_seed
+from card import LAYOUT_VERSION, EncodedCard, encoder_options
+
+
+def card_cache_key(username: str, coin_name: str, bought_sol: float, sold_sol: float, sol_price: float,
+                   background_path: Optional[str], theme: Optional[str], encoder: Optional[str]) -> str:
+    """Content address of a card: identical inputs always render identical bytes"""
+    encoder = encoder or config.ENCODER['format']
+    inputs = [
+        username,
+        coin_name.upper(),
+        float(bought_sol),
+        float(sold_sol),
+        round(sol_price, config.RESULT_CACHE['price_decimals']),
+        background_version(background_path),
+        theme or config.DEFAULT_THEME,
+        encoder
+    ]
+    return content_key(inputs, encoder)
+
+
+def leaderboard_cache_key(title: str, rows: list, background_path: Optional[str], theme: Optional[str], encoder: Optional[str]) -> str:
+    """Content address of a leaderboard card: it changes only when the shown ranking does"""
+    encoder = encoder or config.ENCODER['format']
+    inputs = ['leaderboard', title, [list(row) for row in rows], background_version(background_path), theme or config.DEFAULT_THEME, encoder]
+    return content_key(inputs, encoder)
+
+
+def background_version(background_path: Optional[str]) -> list:
+    """[absolute path, mtime] of a background file, or ['procedural', seed, version] for a generated one"""
+    seed = procedural_seed(background_path)
+    if seed is None:
+        try:
+            return [os.path.abspath(background_path), os.stat(background_path).st_mtime_ns]
+        except (OSError, TypeError):
+            seed = config.PROCEDURAL_BACKGROUNDS['default_seed']
+    return ['procedural', seed, PROCEDURAL_VERSION]
+
+
+def render_version() -> list:
+    """Everything besides an image's own inputs that changes its bytes: drawing code, palettes, fonts and encoder settings"""
+    fonts = config.FONTS
+    return [LAYOUT_VERSION, config.THEMES, fonts['primary_font'], fonts['fallback_font'], fonts['sizes'], config.ENCODER]
+
+
+def content_key(inputs: list, encoder: Optional[str]) -> str:
+    """Cache key for any rendered image: a hash of its JSON-serializable inputs and render_version(), plus the encoder"""
+    encoder = encoder or config.ENCODER['format']
+    # The encoder stays readable so the disk tier knows the file type without an index
+    return f"{hashlib.sha256(json.dumps([inputs, render_version()]).encode()).hexdigest()}-{encoder}"
+
+
+class CardResultCache:
+    """Encoded cards by content key: an in-memory LRU plus an optional on-disk tier"""
+
+    def __init__(self, max_bytes: int = None, disk_dir: str = None, disk_max_bytes: int = None):
+        settings = config.RESULT_CACHE
+        self.max_bytes = settings['max_bytes'] if max_bytes is None else max_bytes
+        self.disk_dir = settings['disk_dir'] if disk_dir is None else disk_dir
+        self.disk_max_bytes = settings['disk_max_bytes'] if disk_max_bytes is None else disk_max_bytes
+        self._cards: 'OrderedDict[str, EncodedCard]' = OrderedDict()
+        self._bytes = 0
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.shared = None               # Optional SharedCacheClient when running as one of several shards
+        self.hits = 0
+        self.disk_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._disk_bytes = sum(entry.stat().st_size for entry in os.scandir(self.disk_dir) if entry.is_file())
+
+    @property
+    def current_bytes(self) -> int:
+        return self._bytes
+
+    def stats(self) -> dict:
+        """Hit/miss counters for reporting"""
+        found = self.hits + self.disk_hits + self.shared_hits
+        lookups = found + self.misses
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'shared_hits': self.shared_hits,
+            'misses': self.misses,
+            'hit_rate': found / lookups if lookups else 0.0,
+            'entries': len(self._cards),
+            'bytes': self._bytes,
+            'disk_bytes': self._disk_bytes
+        }
+
+    def get(self, key: str) -> Optional[EncodedCard]:
+        """Return the cached card for key, checking memory then disk"""
+        card = self._get_local(key)
+        if card is None:
+            self.misses += 1
+        return card
+
+    def _get_local(self, key: str) -> Optional[EncodedCard]:
+        with self._lock:
+            card = self._cards.get(key)
+            if card is not None:
+                self._cards.move_to_end(key)
+                self.hits += 1
+                return card
+
+        card = self._read_disk(key)
+        if card is None:
+            return None
+        self.disk_hits += 1
+        self._remember(key, card)
+        return card
+
+    def put(self, key: str, card: EncodedCard):
+        """Store a freshly rendered card in both tiers"""
+        self._remember(key, card)
+        self._write_disk(key, card)
+
+    async def aget(self, key: str) -> Optional[EncodedCard]:
+        """get() that keeps disk reads off the event loop, then asks the other shards"""
+        if self.disk_dir and key not in self._cards:
+            card = await asyncio.to_thread(self._get_local, key)
+        else:
+            card = self._get_local(key)
+        if card is None and self.shared is not None:
+            card = await self.shared.get_card(key)
+            if card is not None:
+                self.shared_hits += 1
+                self._remember(key, card)
+                return card
+        if card is None:
+            self.misses += 1
+        return card
+
+    async def aput(self, key: str, card: EncodedCard):
+        """put() that keeps disk writes off the event loop and shares the card with the other shards"""
+        self._remember(key, card)
+        if self.disk_dir:
+            await asyncio.to_thread(self._write_disk, key, card)
+        if self.shared is not None:
+            await self.shared.put_card(key, card)
+
+    def clear(self):
+        with self._lock:
+            self._cards.clear()
+            self._bytes = 0
+
+    def _remember(self, key: str, card: EncodedCard):
+        with self._lock:
+            if key in self._cards:
+                self._cards.move_to_end(key)
+                return
+            self._cards[key] = card
+            self._bytes += card.size
+            self._evict()
+
+    def resize(self, max_bytes: int):
+        """Change the in-memory byte cap, evicting least recently used cards to fit"""
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def _evict(self):
+        # Caller holds the lock
+        while self._bytes > self.max_bytes and self._cards:
+            _, evicted = self._cards.popitem(last=False)
+            self._bytes -= evicted.size
+
+    def _disk_path(self, key: str) -> str:
+        encoder = key.rsplit('-', 1)[-1]
+        return os.path.join(self.disk_dir, f"{key}.{encoder_options(encoder)[1]}")
+
+    def _read_disk(self, key: str) -> Optional[EncodedCard]:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)  # Mark as recently used for eviction
+        except OSError:
+            return None
+        encoder = key.rsplit('-', 1)[-1]
+        return EncodedCard(data, encoder, encoder_options(encoder)[1], 0.0)
+
+    def _write_disk(self, key: str, card: EncodedCard):
+        if not self.disk_dir or card.size > self.disk_max_bytes:
+            return
+        path = self._disk_path(key)
+        if os.path.exists(path):
+            return
+        # Write then rename so readers never see a partial file
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(card.data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._disk_bytes += card.size
+            if self._disk_bytes > self.disk_max_bytes:
+                self._evict_disk()
+
+    def _evict_disk(self):
+        # Oldest-used files go first until the tier fits its cap again
+        entries = sorted((entry for entry in os.scandir(self.disk_dir) if entry.is_file()),
+                         key=lambda entry: entry.stat().st_mtime)
+        for entry in entries:
+            if self._disk_bytes <= self.disk_max_bytes:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self._disk_bytes -= size
+            except OSError:
+                pass
@@ -6,29 +6,18 @@ This script checks for dependencies and runs the bot
 
 import sys
 import os
-import subprocess
+from importlib.util import find_spec
 
 def check_dependencies():
-    """Check if all required dependencies are installed"""
-    required_packages = [
-        'discord.py',
-        'Pillow',
-        'python-dotenv'
-    ]
+    """Check if all required dependencies are installed, without importing them"""
+    required_packages = {
+        'discord.py': 'discord',
+        'Pillow': 'PIL',
+        'python-dotenv': 'dotenv',
+        'aiohttp': 'aiohttp'
+    }
     
-    missing_packages = []
-    for package in required_packages:
-        try:
-            if package == 'discord.py':
-                import discord
-            elif package == 'Pillow':
-                import PIL
-            elif package == 'python-dotenv':
-                import dotenv
-        except ImportError:
-            missing_packages.append(package)
-    
-    return missing_packages
+    return [package for package, module in required_packages.items() if find_spec(module) is None]
 
 def check_env_file():
     """Check if .env file exists and has Discord token"""
@@ -85,8 +74,9 @@ def main():
     print("-" * 40)
     
     try:
-        # Import and run the bot
-        import bot
+        # Run the bot in this process, or as several shard processes (SHARD_PROCESSES)
+        from sharding import launch
+        launch()
     except KeyboardInterrupt:
         print("\n🛑 Bot stopped by user")
     except Exception as e:
@@ -0,0 +1,103 @@
+import asyncio
+from collections import Counter, OrderedDict, deque
+from typing import Awaitable, Callable, Dict, Hashable, Tuple
+
+import config
+
+
+class SchedulerBusy(Exception):
+    """Raised when a request cannot even be queued and should be shed right away"""
+
+
+class RenderScheduler:
+    """Admission control in front of card generation
+
+    Limits concurrent jobs globally and per user, coalesces identical in-flight
+    requests from the same user, and starts queued jobs round-robin across users
+    so one user's burst cannot starve everybody else.
+    """
+
+    def __init__(self, global_limit: int = None, per_user_limit: int = None,
+                 max_queued: int = None, max_queued_per_user: int = None):
+        settings = config.SCHEDULER
+        self.global_limit = global_limit or settings['global_limit']
+        self.per_user_limit = per_user_limit or settings['per_user_limit']
+        self.max_queued = max_queued or settings['max_queued']
+        self.max_queued_per_user = max_queued_per_user or settings['max_queued_per_user']
+        self._queues: 'OrderedDict[Hashable, deque]' = OrderedDict()
+        self._queued = 0
+        self._running = 0
+        self._running_per_user: Counter = Counter()
+        self._inflight: Dict[Tuple[Hashable, Hashable], asyncio.Future] = {}
+        self.coalesced = 0
+        self.shed = 0
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    def submit(self, user_id: Hashable, key: Hashable, factory: Callable[[], Awaitable]) -> Awaitable:
+        """Admit a job or raise SchedulerBusy; returns an awaitable for its result
+
+        Synchronous on purpose: callers decide before deferring the interaction.
+        """
+        inflight = self._inflight.get((user_id, key))
+        if inflight is not None:
+            self.coalesced += 1
+            return asyncio.shield(inflight)
+
+        user_queue = self._queues.get(user_id)
+        user_queued = len(user_queue) if user_queue else 0
+        can_start_now = self._running < self.global_limit and self._running_per_user[user_id] < self.per_user_limit
+        if not can_start_now and (self._queued >= self.max_queued or user_queued >= self.max_queued_per_user):
+            self.shed += 1
+            raise SchedulerBusy(f"{self._queued} queued, {self._running} running")
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[(user_id, key)] = future
+        if user_queue is None:
+            user_queue = self._queues[user_id] = deque()
+        user_queue.append((key, future, factory))
+        self._queued += 1
+        self._dispatch()
+        return asyncio.shield(future)
+
+    def _dispatch(self):
+        # Walk users in rotation; whoever gets a slot moves to the back of the line
+        while self._running < self.global_limit and self._queued:
+            for user_id, user_queue in self._queues.items():
+                if self._running_per_user[user_id] < self.per_user_limit:
+                    break
+            else:
+                return
+
+            key, future, factory = user_queue.popleft()
+            self._queued -= 1
+            if user_queue:
+                self._queues.move_to_end(user_id)
+            else:
+                del self._queues[user_id]
+            self._running += 1
+            self._running_per_user[user_id] += 1
+            asyncio.ensure_future(self._run(user_id, key, future, factory))
+
+    async def _run(self, user_id: Hashable, key: Hashable, future: asyncio.Future, factory: Callable[[], Awaitable]):
+        try:
+            result = await factory()
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+        else:
+            if not future.done():
+                future.set_result(result)
+        finally:
+            self._running -= 1
+            self._running_per_user[user_id] -= 1
+            if self._running_per_user[user_id] <= 0:
+                del self._running_per_user[user_id]
+            self._inflight.pop((user_id, key), None)
+            self._dispatch()
@@ -0,0 +1,205 @@
+import asyncio
+import os
+import signal
+import sys
+import time
+from typing import Dict, List, Optional
+
+import aiohttp
+
+import config
+from shared_cache import SharedCacheServer
+
+BOT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bot.py')
+
+
+def is_sharded() -> bool:
+    """Whether this process runs its bot as an AutoShardedBot"""
+    return bool(config.SHARDING['shard_count'])
+
+
+def parse_shard_ids(text: str) -> Optional[List[int]]:
+    """'0-3,6' -> [0, 1, 2, 3, 6]; an empty string means every shard"""
+    if not text.strip():
+        return None
+    ids = []
+    for part in text.split(','):
+        first, _, last = part.strip().partition('-')
+        ids.extend(range(int(first), int(last or first) + 1))
+    return sorted(set(ids))
+
+
+def format_shard_ids(ids: List[int]) -> str:
+    """Contiguous ids as 'first-last', otherwise a comma-separated list"""
+    if ids == list(range(ids[0], ids[-1] + 1)):
+        return f"{ids[0]}-{ids[-1]}" if len(ids) > 1 else str(ids[0])
+    return ','.join(map(str, ids))
+
+
+def split_shards(shard_count: int, processes: int) -> List[List[int]]:
+    """Contiguous shard ranges, as even as possible, one per process"""
+    processes = max(1, min(processes, shard_count))
+    size, extra = divmod(shard_count, processes)
+    ranges, start = [], 0
+    for index in range(processes):
+        end = start + size + (1 if index < extra else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+
+def shard_options() -> dict:
+    """Keyword arguments for the bot's constructor from SHARDING"""
+    count = config.SHARDING['shard_count']
+    if not count or count == 'auto':
+        return {}  # Unsharded, or AutoShardedBot asks Discord how many shards to run
+    return {'shard_count': int(count), 'shard_ids': parse_shard_ids(config.SHARDING['shard_ids'])}
+
+
+async def recommended_shard_count(token: str) -> int:
+    """Shard count Discord recommends for this bot's guild count"""
+    headers = {'Authorization': f'Bot {token}'}
+    async with aiohttp.ClientSession() as session:
+        async with session.get('https://discord.com/api/v10/gateway/bot', headers=headers) as response:
+            if response.status != 200:
+                raise RuntimeError(f"Discord returned HTTP {response.status} for /gateway/bot")
+            return (await response.json())['shards']
+
+
+class ShardLauncher:
+    """Runs the bot as several processes, each with a range of shards
+
+    The launcher hosts the shared price and card cache on a Unix socket,
+    restarts shard processes that exit, and reports each one's event-loop
+    health from the reports they send every SHARDING['health_interval'].
+    """
+
+    def __init__(self, processes: int = None, shard_count: int = None):
+        settings = config.SHARDING
+        self.settings = settings
+        self.processes = processes or settings['processes']
+        self.shard_count = shard_count
+        self.socket = os.path.abspath(settings['socket'] or os.path.join('data', 'shared-cache.sock'))
+        self.cache = SharedCacheServer(self.socket)
+        self._children: Dict[str, asyncio.subprocess.Process] = {}
+        self._stopping = asyncio.Event()
+        self._warned: Dict[str, float] = {}
+        self.started = time.time()
+
+    async def run(self):
+        if not self.shard_count:
+            count = self.settings['shard_count']
+            if count and count != 'auto':
+                self.shard_count = int(count)
+            else:
+                # Never fewer shards than processes, or some processes would sit idle
+                self.shard_count = max(self.processes, await recommended_shard_count(config.DISCORD_TOKEN))
+        ranges = split_shards(self.shard_count, self.processes)
+        print(f"🧩 {self.shard_count} shard(s) across {len(ranges)} process(es): {', '.join(format_shard_ids(ids) for ids in ranges)}")
+
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, self._stopping.set)
+
+        await self.cache.start()
+        tasks = [asyncio.create_task(self._supervise(index, ids)) for index, ids in enumerate(ranges)]
+        monitor = asyncio.create_task(self._monitor([format_shard_ids(ids) for ids in ranges]))
+        try:
+            await self._stopping.wait()
+            print("🛑 Stopping shard processes...")
+            await asyncio.gather(*(self._stop_child(child) for child in list(self._children.values())))
+            await asyncio.gather(*tasks)
+        finally:
+            monitor.cancel()
+            await self.cache.stop()
+
+    def _environment(self, index: int, shard_ids: List[int]) -> dict:
+        env = dict(os.environ)
+        env.update({
+            'SHARD_COUNT': str(self.shard_count),
+            'SHARD_IDS': format_shard_ids(shard_ids),
+            'SHARD_PROCESSES': '1',
+            'SHARED_CACHE_SOCKET': self.socket,
+            'METRICS_PORT': str(config.METRICS['port'] + index),
+            'PYTHONUNBUFFERED': '1'
+        })
+        if index > 0:
+            env['RENDER_SERVER_ENABLED'] = '0'  # One HTTP render service per machine, in the first process
+        # The machine's cores and memory budget are split between the processes, not given to each
+        if not config.RENDER_EXECUTOR['workers']:
+            env['RENDER_WORKERS'] = str(max(1, (os.cpu_count() or 1) // self.processes))
+        if config.MEMORY_BUDGET['total_mb']:
+            env['MEMORY_BUDGET_MB'] = str(config.MEMORY_BUDGET['total_mb'] // self.processes)
+        return env
+
+    async def _supervise(self, index: int, shard_ids: List[int]):
+        """Run one shard process, restarting it until the launcher stops"""
+        label = format_shard_ids(shard_ids)
+        while not self._stopping.is_set():
+            # Own session, so Ctrl+C reaches only the launcher, which then stops each shard cleanly
+            child = await asyncio.create_subprocess_exec(
+                sys.executable, BOT_SCRIPT, env=self._environment(index, shard_ids),
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT, start_new_session=True
+            )
+            self._children[label] = child
+            print(f"🚀 Shard(s) {label} started as pid {child.pid}")
+            async for line in child.stdout:
+                print(f"[shard {label}] {line.decode(errors='replace').rstrip()}")
+            code = await child.wait()
+            del self._children[label]
+            if self._stopping.is_set():
+                break
+            print(f"❌ Shard(s) {label} exited with code {code}, restarting in {self.settings['restart_delay']:g}s")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.settings['restart_delay'])
+            except asyncio.TimeoutError:
+                pass
+
+    async def _stop_child(self, child: asyncio.subprocess.Process, timeout: float = 15.0):
+        # SIGINT lets the bot close cleanly: pending ledger writes are flushed, workers exit
+        if child.returncode is None:
+            child.send_signal(signal.SIGINT)
+        try:
+            await asyncio.wait_for(child.wait(), timeout)
+        except asyncio.TimeoutError:
+            child.kill()
+
+    async def _monitor(self, labels: List[str]):
+        """Warn about lagging or silent shards; log every shard's health now and then"""
+        interval = self.settings['health_interval']
+        last_log = time.monotonic()
+        while True:
+            await asyncio.sleep(interval)
+            now = time.time()
+            for label in labels:
+                report = self.cache.health.get(label)
+                if report is None:
+                    if now - self.started > 3 * interval:
+                        print(f"⚠️ No health report from shard(s) {label} yet")
+                    continue
+                silent = now - report['received_at']
+                if silent > 3 * interval:
+                    print(f"⚠️ Shard(s) {label} last reported {silent:.0f}s ago")
+                elif report['loop_lag_max'] > self.settings['lag_warning'] and self._warned.get(label) != report['received_at']:
+                    self._warned[label] = report['received_at']
+                    print(f"⚠️ Shard(s) {label} event loop lagged {report['loop_lag_max'] * 1000:.0f}ms")
+
+            if time.monotonic() - last_log >= self.settings['health_log_interval']:
+                last_log = time.monotonic()
+                for label in labels:
+                    report = self.cache.health.get(label)
+                    if report is not None:
+                        gateway = ', '.join(f"{shard}: {latency * 1000:.0f}ms" for shard, latency in sorted(report['latencies'].items()))
+                        print(f"🩺 Shard(s) {label}: {'ready' if report['ready'] else 'connecting'}, "
+                              f"loop lag {report['loop_lag'] * 1000:.0f}ms (max {report['loop_lag_max'] * 1000:.0f}ms), "
+                              f"gateway {gateway or 'n/a'}, {report['guilds']} guild(s), {report['render_queue']} render(s) queued")
+                print(f"🔗 Shared cache: {len(self.cache)} card(s), {self.cache.current_bytes / 1024 / 1024:.1f} MB")
+
+
+def launch():
+    """Run the bot: in this process, or as SHARDING['processes'] shard processes"""
+    if config.SHARDING['processes'] <= 1:
+        import bot
+        bot.main()
+    else:
+        asyncio.run(ShardLauncher().run())
@@ -0,0 +1,175 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import aiohttp
+from aiohttp import web
+
+import config
+from card import EncodedCard
+
+
+class SharedCacheServer:
+    """Price quotes, encoded cards and shard health shared by every shard process
+
+    Served over HTTP on a Unix socket by the launcher, so it is only reachable
+    from this machine and needs no port. Cards are kept in a byte-capped LRU.
+    """
+
+    def __init__(self, path: str = None, max_bytes: int = None):
+        settings = config.SHARDING
+        self.path = path or settings['socket']
+        self.max_bytes = settings['shared_card_bytes'] if max_bytes is None else max_bytes
+        self._prices: Dict[str, Tuple[float, float]] = {}          # coin_id -> (price, wall-clock fetch time)
+        self._cards: 'OrderedDict[str, Tuple[bytes, str, str]]' = OrderedDict()
+        self._bytes = 0
+        self.health: Dict[str, dict] = {}
+        self._runner: Optional[web.AppRunner] = None
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=16 * 1024 * 1024)
+        app.router.add_get('/prices', self.handle_get_prices)
+        app.router.add_put('/prices', self.handle_put_prices)
+        app.router.add_get('/cards/{key}', self.handle_get_card)
+        app.router.add_put('/cards/{key}', self.handle_put_card)
+        app.router.add_put('/health/{shard}', self.handle_put_health)
+        app.router.add_get('/health', self.handle_get_health)
+        return app
+
+    async def start(self):
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # Left behind by a launcher that did not exit cleanly
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        await web.UnixSite(self._runner, self.path).start()
+        print(f"🔗 Shared cache on {self.path}")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def __len__(self):
+        return len(self._cards)
+
+    @property
+    def current_bytes(self) -> int:
+        return self._bytes
+
+    async def handle_get_prices(self, request: web.Request) -> web.Response:
+        now = time.time()
+        ids = [coin_id for coin_id in request.query.get('ids', '').split(',') if coin_id]
+        return web.json_response({coin_id: [self._prices[coin_id][0], now - self._prices[coin_id][1]]
+                                  for coin_id in ids if coin_id in self._prices})
+
+    async def handle_put_prices(self, request: web.Request) -> web.Response:
+        now = time.time()
+        for coin_id, price in (await request.json()).items():
+            self._prices[coin_id] = (float(price), now)
+        return web.Response(status=204)
+
+    async def handle_get_card(self, request: web.Request) -> web.Response:
+        key = request.match_info['key']
+        card = self._cards.get(key)
+        if card is None:
+            return web.Response(status=404)
+        self._cards.move_to_end(key)
+        data, encoder, extension = card
+        return web.Response(body=data, headers={'X-Encoder': encoder, 'X-Extension': extension})
+
+    async def handle_put_card(self, request: web.Request) -> web.Response:
+        key = request.match_info['key']
+        if key not in self._cards:
+            data = await request.read()
+            self._cards[key] = (data, request.headers['X-Encoder'], request.headers['X-Extension'])
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes and self._cards:
+                _, (evicted, _, _) = self._cards.popitem(last=False)
+                self._bytes -= len(evicted)
+        return web.Response(status=204)
+
+    async def handle_put_health(self, request: web.Request) -> web.Response:
+        report = await request.json()
+        report['received_at'] = time.time()
+        self.health[request.match_info['shard']] = report
+        return web.Response(status=204)
+
+    async def handle_get_health(self, request: web.Request) -> web.Response:
+        return web.json_response(self.health)
+
+
+class SharedCacheClient:
+    """A shard's connection to the shared cache
+
+    Every call is best effort: if the launcher's cache is unreachable the shard
+    carries on with its own caches and the call returns None or empty.
+    """
+
+    def __init__(self, path: str = None, timeout: float = None):
+        self.path = path or config.SHARDING['socket']
+        self.timeout = aiohttp.ClientTimeout(total=timeout or config.SHARDING['cache_timeout'])
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.errors = 0
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        # Created lazily so the session binds to the running event loop
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(connector=aiohttp.UnixConnector(path=self.path), timeout=self.timeout)
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def get_prices(self, coin_ids: list, max_age: float) -> Dict[str, Tuple[float, float]]:
+        """coin_id -> (price, age in seconds) for quotes another shard fetched within max_age"""
+        try:
+            session = await self._get_session()
+            async with session.get('http://shared/prices', params={'ids': ','.join(coin_ids)}) as response:
+                prices = await response.json()
+            return {coin_id: (price, age) for coin_id, (price, age) in prices.items() if age < max_age}
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            self.errors += 1
+            return {}
+
+    async def put_prices(self, prices: Dict[str, float]):
+        try:
+            session = await self._get_session()
+            async with session.put('http://shared/prices', json=prices):
+                pass
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            self.errors += 1
+
+    async def get_card(self, key: str) -> Optional[EncodedCard]:
+        try:
+            session = await self._get_session()
+            async with session.get(f'http://shared/cards/{key}') as response:
+                if response.status != 200:
+                    return None
+                return EncodedCard(await response.read(), response.headers['X-Encoder'], response.headers['X-Extension'], 0.0)
+        except (aiohttp.ClientError, asyncio.TimeoutError, KeyError):
+            self.errors += 1
+            return None
+
+    async def put_card(self, key: str, card: EncodedCard):
+        try:
+            session = await self._get_session()
+            headers = {'X-Encoder': card.encoder, 'X-Extension': card.extension}
+            async with session.put(f'http://shared/cards/{key}', data=card.data, headers=headers):
+                pass
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            self.errors += 1
+
+    async def report_health(self, shard: str, report: dict):
+        try:
+            session = await self._get_session()
+            async with session.put(f'http://shared/health/{shard}', json=report):
+                pass
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            self.errors += 1
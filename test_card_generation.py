@@ -13,6 +13,7 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 try:
     from bot import PNLCard
+    from backgrounds import background_index
     import config
 except ImportError as e:
     print(f"❌ Error importing modules: {e}")
@@ -66,6 +67,9 @@ def generate_sample_cards():
         }
     ]
     
+    # Validate and decode the backgrounds once for all samples
+    background_index.refresh()
+    
     print("🎨 Generating sample Solana PNL cards...")
     print("=" * 50)
     
@@ -74,12 +78,7 @@ def generate_sample_cards():
             print(f"({i}/{len(samples)}) Creating {sample['description']}...")
             
             # Create PNL card with custom background
-            background_path = None
-            if os.path.exists(config.BACKGROUNDS_FOLDER):
-                for file in os.listdir(config.BACKGROUNDS_FOLDER):
-                    if file.lower().endswith(('.png', '.jpg', '.jpeg')) and not file.startswith('.'):
-                        background_path = f"{config.BACKGROUNDS_FOLDER}/{file}"
-                        break
+            background_path = background_index.get()
             
             pnl_card = PNLCard(
                 username=sample['username'],
@@ -96,7 +95,7 @@ def generate_sample_cards():
             # Save to file
             filename = f"sample_{sample['name']}.png"
             with open(filename, 'wb') as f:
-                f.write(card_image.getvalue())
+                f.write(card_image.read())
             
             # Display trade info
             print(f"   👤 User: {sample['username']}")
@@ -155,12 +154,8 @@ def test_custom_card():
         print(f"\n🎨 Creating {username}'s {coin_name.upper()} PNL card...")
         
         # Create and generate card with custom background
-        background_path = None
-        if os.path.exists(config.BACKGROUNDS_FOLDER):
-            for file in os.listdir(config.BACKGROUNDS_FOLDER):
-                if file.lower().endswith(('.png', '.jpg', '.jpeg')) and not file.startswith('.'):
-                    background_path = f"{config.BACKGROUNDS_FOLDER}/{file}"
-                    break
+        background_index.refresh()
+        background_path = background_index.get()
         
         pnl_card = PNLCard(username, coin_name, bought_sol, sold_sol, sol_price, background_path)
         card_image = pnl_card.generate_card()
@@ -168,7 +163,7 @@ def test_custom_card():
         # Save the card
         filename = f"custom_{username.lower()}_{coin_name.lower()}_pnl.png"
         with open(filename, 'wb') as f:
-            f.write(card_image.getvalue())
+            f.write(card_image.read())
         
         print(f"✅ Custom card created: {filename}")
         # Format SOL amount with K if >= 1000
@@ -186,6 +181,143 @@ def test_custom_card():
     except Exception as e:
         print(f"❌ Error creating custom card: {e}")
 
+def test_encoded_card_allocations():
+    """Measure per-card allocations with tracemalloc: encoding keeps one copy of the bytes,
+    and handing a card to an upload or back from a worker process copies none"""
+    import asyncio
+    import tracemalloc
+    from card import encode_image, render_card
+    from render_executor import RenderExecutor, shared_memory_folder
+    
+    background_index.refresh()
+    args = ('CryptoHawk', 'SOL', 10.0, 15.0, 150.0, background_index.get())
+    img = PNLCard(*args).render_image()
+    
+    def traced(fn):
+        """(result, bytes still allocated, peak bytes) for one call"""
+        tracemalloc.start()
+        try:
+            result = fn()
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return result, current, peak
+    
+    encoded, kept, peak = traced(lambda: encode_image(img))
+    print(f"encode: {encoded.size} bytes, kept {kept / encoded.size:.2f}x, peak {peak / encoded.size:.2f}x")
+    assert kept < encoded.size * 1.05 + 4096  # BytesIO.getvalue() hands over its buffer
+    
+    reader, kept, _ = traced(encoded.open)
+    assert kept < 1024 and reader.read() == encoded.data
+    
+    if not shared_memory_folder():
+        return
+    
+    async def worker_handoff(shared: bool):
+        executor = RenderExecutor('process', 1)
+        executor.shared_folder = shared_memory_folder() if shared else ''
+        try:
+            await executor.run(render_card, *args)  # Start the worker and fill its caches
+            tracemalloc.start()
+            try:
+                card = await executor.run(render_card, *args)
+                kept = tracemalloc.get_traced_memory()[0]
+            finally:
+                tracemalloc.stop()
+            return card, kept
+        finally:
+            executor.shutdown()
+    
+    settings = config.RENDER_EXECUTOR
+    min_bytes, settings['shared_memory_min_bytes'] = settings['shared_memory_min_bytes'], 0
+    try:
+        pickled, pickled_kept = asyncio.run(worker_handoff(False))
+        shared, shared_kept = asyncio.run(worker_handoff(True))
+    finally:
+        settings['shared_memory_min_bytes'] = min_bytes
+    print(f"worker hand-off: pickled {pickled_kept} bytes, shared memory {shared_kept} bytes")
+    assert shared.data == pickled.data == encoded.data
+    assert pickled_kept >= encoded.size and shared_kept < 16 * 1024
+
+def test_slow_price_upstream():
+    """A price API that never answers in time must not stall other coroutines, and a fetch
+    gives up by PRICE_FETCH['deadline'] with retries included"""
+    import asyncio
+    import time
+    from aiohttp import web
+    from price_service import PriceService, PriceUnavailable
+    
+    async def scenario():
+        release = asyncio.Event()
+        requests = 0
+        
+        async def slow_price(request):
+            nonlocal requests
+            requests += 1
+            await release.wait()  # Much slower than any attempt timeout
+            return web.json_response({'solana': {'usd': 150.0}})
+        
+        app = web.Application()
+        app.router.add_get('/price', slow_price)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        service = PriceService(api_url=f'http://127.0.0.1:{port}/price')
+        
+        ticks = 0
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+        
+        ticking = asyncio.create_task(ticker())
+        started = time.monotonic()
+        try:
+            try:
+                await service._fetch(['solana'])
+                raise AssertionError("fetch from a stalled upstream should fail")
+            except PriceUnavailable:
+                pass
+            elapsed = time.monotonic() - started
+        finally:
+            ticking.cancel()
+            release.set()
+            await service.close()
+            await runner.cleanup()
+        return elapsed, ticks, requests
+    
+    settings = config.PRICE_FETCH
+    saved = dict(settings)
+    settings.update({'attempts': 3, 'attempt_timeout': 0.3, 'backoff': 0.05, 'deadline': 0.8})
+    try:
+        elapsed, ticks, requests = asyncio.run(scenario())
+    finally:
+        settings.update(saved)
+    print(f"slow upstream: gave up after {elapsed:.2f}s and {requests} attempt(s), ticker advanced {ticks} time(s)")
+    assert requests == 3
+    assert elapsed <= 0.8 + 0.2
+    assert ticks >= elapsed / 0.01 * 0.5  # The loop kept serving the ticker while fetches waited
+
+def test_memory_budget():
+    """100 cards rendered at once under a 400 MB budget keep peak RSS (this process plus
+    its render workers) within the budget"""
+    from backgrounds import background_cache
+    from benchmark_render import run_memory
+    from card import template_cache
+    from fonts import font_registry
+    
+    saved = (background_cache.max_bytes, template_cache.max_bytes, dict(config.FONTS))
+    try:
+        assert run_memory(400, 100) == 0
+        assert font_registry.current_bytes <= config.FONTS['max_bytes']
+    finally:
+        background_cache.resize(saved[0])
+        template_cache.resize(saved[1])
+        config.FONTS.update(saved[2])
+
 def main():
     print("🚀 Custom PNL Card Generation Test")
     print("=" * 45)
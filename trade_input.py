@@ -0,0 +1,100 @@
+import csv
+import io
+import json
+import math
+import re
+from typing import Iterable, List, Optional
+
+# Accepted column names for each trade field
+FIELD_ALIASES = {
+    'username': ('username', 'user', 'trader'),
+    'coin_name': ('coin_name', 'coin', 'symbol'),
+    'bought': ('bought', 'bought_sol', 'bought_amount'),
+    'sold': ('sold', 'sold_sol', 'sold_amount')
+}
+
+
+def read_trades(source, input_format: str):
+    """Yield trade dicts from a CSV or JSONL stream"""
+    if input_format == 'csv':
+        yield from csv.DictReader(source)
+        return
+    for line in source:
+        line = line.strip()
+        if line:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                yield None
+
+
+def detect_format(path: str, first_line: str) -> str:
+    if path.lower().endswith('.csv'):
+        return 'csv'
+    if path.lower().endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    return 'jsonl' if first_line.lstrip().startswith('{') else 'csv'
+
+
+def parse_amount(value, field: str) -> float:
+    """A trade amount as a float; nan and inf are rejected before they reach the ledger or rankings"""
+    amount = float(value)
+    if not math.isfinite(amount):
+        raise ValueError(f"'{field}' must be a finite number")
+    return amount
+
+
+def normalize_trade(row: dict, username: Optional[str] = None) -> dict:
+    """Map a CSV/JSONL row onto PNLCard arguments; username fills in a missing username column"""
+    if not isinstance(row, dict):
+        raise ValueError("not a JSON object")
+    trade = {}
+    for field, aliases in FIELD_ALIASES.items():
+        for alias in aliases:
+            if row.get(alias) not in (None, ''):
+                trade[field] = row[alias]
+                break
+        else:
+            if field == 'username' and username:
+                trade[field] = username
+                continue
+            raise ValueError(f"missing '{field}'")
+    trade['bought'] = parse_amount(trade['bought'], 'bought')
+    trade['sold'] = parse_amount(trade['sold'], 'sold')
+    return trade
+
+
+def parse_trade_text(text: str, username: str) -> List[dict]:
+    """Parse "SOL 10 15, BONK 2 3.5" (coin, bought, sold per trade; commas, semicolons or new lines between)"""
+    trades = []
+    for number, entry in enumerate(filter(None, (part.strip() for part in re.split(r'[,;\n]+', text))), 1):
+        parts = entry.split()
+        if len(parts) != 3:
+            raise ValueError(f"Trade {number} ('{entry}') should be: COIN BOUGHT SOLD")
+        try:
+            bought, sold = float(parts[1]), float(parts[2])
+        except ValueError:
+            raise ValueError(f"Trade {number} ('{entry}') has a non-numeric amount")
+        try:
+            trades.append(normalize_trade({'username': username, 'coin_name': parts[0], 'bought': bought, 'sold': sold}))
+        except ValueError as e:
+            raise ValueError(f"Trade {number} ('{entry}'): {e}")
+    return trades
+
+
+def parse_trade_file(data: bytes, filename: str, username: str) -> List[dict]:
+    """Parse an uploaded CSV or JSONL file of trades"""
+    text = data.decode('utf-8-sig')
+    input_format = detect_format(filename, text.split('\n', 1)[0])
+    trades = []
+    for number, row in enumerate(read_trades(io.StringIO(text, newline=''), input_format), 1):
+        try:
+            trades.append(normalize_trade(row, username))
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"Row {number}: {e}")
+    return trades
+
+
+def trade_rows(trades: Iterable[dict]) -> List[tuple]:
+    """(coin_name, bought, sold) tuples: a compact, picklable form for render workers"""
+    return [(trade['coin_name'].upper(), trade['bought'], trade['sold']) for trade in trades]